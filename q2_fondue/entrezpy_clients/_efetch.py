@@ -8,6 +8,7 @@
 
 import json
 from typing import List, Union
+from xml.parsers.expat import ExpatError
 
 import pandas as pd
 from entrezpy.base.result import EutilsResult
@@ -21,17 +22,46 @@ from q2_fondue.entrezpy_clients._sra_meta import (
 )
 
 
+# maps LibraryMetadata fields to the corresponding XML tags
+LIBRARY_TAGS = {
+    'name': 'LIBRARY_NAME',
+    'selection': 'LIBRARY_SELECTION',
+    'source': 'LIBRARY_SOURCE'
+}
+
+
+def _parse_xml(xml: str, **kwargs) -> dict:
+    """Parses an XML string into a dictionary.
+
+    Attributes are prefixed with '@', as expected by all the metadata
+    extraction methods. xmltodict enables expat's `buffer_text` on its
+    parser, so long text fields are not delivered in small chunks.
+
+    Args:
+        xml (str): XML string to be parsed.
+        **kwargs: Additional arguments passed to xmltodict, e.g. to
+            enable streaming mode with `item_depth` and `item_callback`.
+
+    Returns:
+        dict: Parsed XML.
+    """
+    return parsexml(
+        xml, process_namespaces=False, attr_prefix='@',
+        dict_constructor=dict, **kwargs
+    )
+
+
 class EFetchResult(EutilsResult):
     """Entrezpy client for EFetch utility used to fetch SRA metadata."""
 
     def __init__(self, response, request, log_level):
         super().__init__(request.eutil, request.query_id, request.db)
-        self.metadata_raw = None
         self.metadata = []
         self.studies = {}
         self.samples = {}
         self.experiments = {}
         self.runs = {}
+        self._metadata_df = None
         self.logger = set_up_logger(log_level, self)
 
     def size(self):
@@ -52,11 +82,24 @@ class EFetchResult(EutilsResult):
     def metadata_to_df(self) -> pd.DataFrame:
         """Converts collected metadata into a DataFrame.
 
+        The DataFrame is cached until more metadata is added, so that
+        repeated calls do not need to walk through all the SRA objects
+        again - every call returns a copy of the cached DataFrame, which
+        can be modified freely.
+
         Returns:
             pd.DataFrame: Metadata in a form of a DataFrame with an index
                 corresponding to the run IDs.
         """
-        df = pd.concat([v.generate_meta() for v in self.studies.values()])
+        if self._metadata_df is not None:
+            return self._metadata_df.copy()
+        if not self.studies:
+            return pd.DataFrame()
+
+        df = pd.concat(
+            [v.generate_meta() for v in self.studies.values()],
+            copy=False, sort=False
+        )
         df.index.name = 'ID'
 
         # remove empty columns, if any
@@ -75,7 +118,8 @@ class EFetchResult(EutilsResult):
         cols = META_REQUIRED_COLUMNS.copy()
         cols.extend([c for c in df.columns if c not in cols])
 
-        return df[cols]
+        self._metadata_df = df[cols]
+        return self._metadata_df.copy()
 
     def extract_run_ids(self, response):
         """Extracts run IDs from an EFetch response.
@@ -87,7 +131,7 @@ class EFetchResult(EutilsResult):
         Args:
             response (io.StringIO): Response received from Efetch.
         """
-        response = json.loads(json.dumps(parsexml(response.read())))
+        response = _parse_xml(response.read())
         result = response['eSummaryResult'].get('DocSum')
         if result:
             result = [result] if not isinstance(result, list) else result
@@ -97,7 +141,7 @@ class EFetchResult(EutilsResult):
                     for k, v in item.items():
                         if 'Run acc' in v:
                             runs = f'<Runs>{v.strip()}</Runs>'
-                            runs = json.loads(json.dumps(parsexml(runs)))
+                            runs = _parse_xml(runs)
                             runs = runs['Runs'].get('Run')
                             runs = [runs] if isinstance(runs, dict) else runs
                             self.metadata += [x.get('@acc') for x in runs]
@@ -230,9 +274,8 @@ class EFetchResult(EutilsResult):
         """
         lib_meta = attributes['EXPERIMENT']['DESIGN'].get('LIBRARY_DESCRIPTOR')
 
-        keys = ['name', 'selection', 'source']
-        lib = {k: lib_meta.get(f'LIBRARY_{k.upper()}') for k in keys}
-        lib['layout'] = list(lib_meta.get('LIBRARY_LAYOUT').keys())[0]
+        lib = {k: lib_meta.get(tag) for k, tag in LIBRARY_TAGS.items()}
+        lib['layout'] = next(iter(lib_meta.get('LIBRARY_LAYOUT')))
 
         return LibraryMetadata(**lib)
 
@@ -416,9 +459,11 @@ class EFetchResult(EutilsResult):
                 processed_meta.update(attr_dedupl)
             except Exception as e:
                 self.logger.exception(
-                    f'Exception has occurred when processing {level} '
-                    f'attributes: "{e}". Contents of the metadata '
-                    f'was: {attributes}.')
+                    'Exception has occurred when processing %s '
+                    'attributes: "%s".', level, e)
+                # the metadata can be large, only format them if needed
+                self.logger.debug(
+                    'Contents of the metadata was: %r.', attributes)
                 raise
         return processed_meta
 
@@ -474,29 +519,42 @@ class EFetchResult(EutilsResult):
         Dictionary keys represent original accession IDs and the values
         correspond to corresponding metadata extracted from the XML response.
 
+        The response is parsed in streaming mode: every EXPERIMENT_PACKAGE
+        is processed as soon as it was parsed and discarded afterwards, so
+        that only a single package is kept in memory at any time. If the
+        response is malformed, packages preceding the error are retained.
+
         Args:
             response (io.StringIO): Response received from Efetch.
             uids (List[str]): List of accession IDs for which
                 the data was fetched.
 
         """
-        # use json to quickly get rid of OrderedDicts
-        self.metadata_raw = json.loads(json.dumps(parsexml(response.read())))
-        parsed_results = self.metadata_raw[
-            'EXPERIMENT_PACKAGE_SET']['EXPERIMENT_PACKAGE']
-
-        # TODO: we should also handle extracting multiple runs
-        #  from the same experiment
-        if not isinstance(parsed_results, list):
-            parsed_results = [parsed_results]
-        run_ids_map = self._find_all_run_ids(parsed_results)
-
-        found_uids = set(run_ids_map.keys())
-        for i, uid in enumerate(uids):
-            if uid in found_uids:
-                current_run = run_ids_map[uid]
-                self.metadata += self._process_single_id(
-                    parsed_results[current_run], desired_id=uid)
+        uids = set(uids)
+        self._metadata_df = None
+
+        def _process_package(path, package):
+            # TODO: we should also handle extracting multiple runs
+            #  from the same experiment
+            for uid in self._find_all_run_ids([package]):
+                if uid in uids:
+                    self.metadata += self._process_single_id(
+                        package, desired_id=uid)
+            return True
+
+        try:
+            _parse_xml(
+                response.read(), item_depth=2,
+                item_callback=_process_package
+            )
+        except ExpatError as e:
+            # NCBI occasionally returns truncated responses - we keep all
+            # the packages which could be processed before the error
+            self.logger.warning(
+                'EFetch response could not be parsed completely (%s). '
+                'Metadata will only be extracted for the records preceding '
+                'the error.', e
+            )
 
 
 class EFetchAnalyzer(EfetchAnalyzer):
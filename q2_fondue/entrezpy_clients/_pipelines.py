@@ -116,10 +116,12 @@ def _get_run_ids(
 
     econduit.run(run_ids_pipeline)
 
-    # recover run IDs from all instances of EFetchAnalyzer
-    all_run_ids = []
+    # recover run IDs from all instances of EFetchAnalyzer - the same run
+    # can be linked to more than one of the provided IDs (e.g., when
+    # experiments or samples overlap), so the IDs are deduplicated
+    all_run_ids = set()
     for x in econduit.analyzers.values():
         if isinstance(x, EFetchAnalyzer):
-            all_run_ids.extend(x.result.metadata)
+            all_run_ids.update(x.result.metadata)
 
     return sorted(all_run_ids)
@@ -53,14 +53,6 @@ class SRABaseMeta(metaclass=ABCMeta):
     custom_meta: Union[dict, None]
     child: str = None
 
-    def __post_init__(self):
-        """Initializes custom metadata DataFrame."""
-        if self.custom_meta:
-            self.custom_meta_df = pd.DataFrame(
-                self.custom_meta, index=[self.id])
-        else:
-            self.custom_meta_df = None
-
     def __eq__(self, other):
         """Compares all attributes. To be used on subclasses that contain
             DataFrames as attributes."""
@@ -85,18 +77,15 @@ class SRABaseMeta(metaclass=ABCMeta):
         Returns:
             base_meta (pd.DataFrame): Requested base metadata.
         """
-        index = get_attrs(
-            self,
-            excluded=('child', 'custom_meta', 'custom_meta_df') + excluded)
-        base_meta = pd.DataFrame(
-            data={k: getattr(self, k) for k in index}, index=[self.id])
+        index = get_attrs(self, excluded=('child', 'custom_meta') + excluded)
+        base_meta = {k: getattr(self, k) for k in index}
 
+        # merge custom metadata before constructing the DataFrame so that
+        # only a single one needs to be created
         if self.custom_meta:
-            base_meta = pd.concat(
-                [base_meta, self.custom_meta_df], axis=1,
-            )
+            base_meta.update(self.custom_meta)
 
-        return base_meta
+        return pd.DataFrame(data=base_meta, index=[self.id])
 
     def get_child_metadata(self) -> pd.DataFrame:
         """Generates a DataFrame containing metadata of all the
@@ -108,7 +97,7 @@ class SRABaseMeta(metaclass=ABCMeta):
         child_meta_dfs = [x.generate_meta() for x in
                           self.__getattribute__(f'{self.child}s')]
         if child_meta_dfs:
-            child_meta = pd.concat(child_meta_dfs)
+            child_meta = pd.concat(child_meta_dfs, copy=False, sort=False)
         else:
             child_meta = pd.DataFrame()
         child_meta.index.name = f'{self.child}_id'
@@ -150,9 +139,8 @@ class SRARun(SRABaseMeta):
 
     def __post_init__(self):
         """Calculates an average spot length."""
-        super().__post_init__()
         if self.spots > 0:
-            self.avg_spot_len = int(self.bases/self.spots)
+            self.avg_spot_len = self.bases // self.spots
         else:
             self.avg_spot_len = 0
 
@@ -196,7 +184,9 @@ class SRAExperiment(SRABaseMeta):
         lib_meta = self.library.generate_meta()
         lib_meta.index = exp_meta.index
 
-        exp_meta = pd.concat([exp_meta, lib_meta], axis=1)
+        exp_meta = pd.concat(
+            [exp_meta, lib_meta], axis=1, copy=False, sort=False
+        )
         runs_meta = self.get_child_metadata()
         if len(runs_meta) > 0:
             runs_merged = runs_meta.merge(
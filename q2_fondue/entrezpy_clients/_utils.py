@@ -6,10 +6,20 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import gzip
 import logging
 import sys
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import urllib.response
+from contextlib import contextmanager
+from functools import lru_cache
+from types import SimpleNamespace
 
 import pandas as pd
+from entrezpy.requester import requester
 
 PREFIX = {
     'run': ('SRR', 'ERR', 'DRR'),
@@ -64,14 +74,12 @@ def set_up_entrezpy_logging(entrezpy_obj, log_level):
         entrezpy_obj (object): An Entrezpy object that has a logger attribute.
         log_level (str): The log level to set.
     """
-    handler = set_up_logging_handler()
-
-    entrezpy_obj.logger.addHandler(handler)
-    entrezpy_obj.logger.setLevel(log_level)
+    _add_logging_handler(entrezpy_obj.logger)
+    set_log_level(entrezpy_obj.logger, log_level)
 
     if hasattr(entrezpy_obj, 'request_pool'):
-        entrezpy_obj.request_pool.logger.addHandler(handler)
-        entrezpy_obj.request_pool.logger.setLevel(log_level)
+        _add_logging_handler(entrezpy_obj.request_pool.logger)
+        set_log_level(entrezpy_obj.request_pool.logger, log_level)
 
 
 def set_up_logger(log_level, cls_obj=None, logger_name=None) -> logging.Logger:
@@ -90,17 +98,111 @@ def set_up_logger(log_level, cls_obj=None, logger_name=None) -> logging.Logger:
         )
     else:
         logger = logging.getLogger(logger_name)
-    logger.setLevel(log_level)
-    handler = set_up_logging_handler()
-    logger.addHandler(handler)
+    set_log_level(logger, log_level)
+    _add_logging_handler(logger)
     return logger
 
 
+def set_log_level(logger: logging.Logger, log_level):
+    """Sets the level of the logger, unless it is already set to it.
+
+    Changing the level invalidates the cached levels of all the loggers,
+    so this is skipped when the same action is run repeatedly with the
+    same log level.
+
+    Args:
+        logger (logging.Logger): The logger to be configured.
+        log_level (str): The log level to set.
+    """
+    if logging.getLevelName(logger.level) != log_level:
+        logger.setLevel(log_level)
+
+
+def _add_logging_handler(logger: logging.Logger):
+    """Attaches the shared logging handler to the logger, unless it was
+        already attached before (e.g., by a previous query or batch).
+    """
+    handler = set_up_logging_handler()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+
+
+@lru_cache(maxsize=None)
 def set_up_logging_handler():
-    """Sets up logging handler."""
+    """Sets up logging handler.
+
+    The handler is only created once and shared by all the loggers.
+    """
     handler = logging.StreamHandler(sys.stdout)
     formatter = logging.Formatter(
         '%(asctime)s [%(threadName)s] [%(levelname)s] '
         '[%(name)s]: %(message)s')
     handler.setFormatter(formatter)
     return handler
+
+
+class _GzipEFetchHandler(urllib.request.BaseHandler):
+    """Asks NCBI for gzip-compressed EFetch responses and transparently
+        decompresses them, so that the analyzers receive plain XML.
+    """
+    # run before the HTTP error processor (order 1000), so that the bodies
+    # of error responses are decompressed as well
+    handler_order = 900
+
+    def http_request(self, request):
+        if request.full_url.endswith('/efetch.fcgi'):
+            request.add_unredirected_header('Accept-Encoding', 'gzip')
+        return request
+
+    def http_response(self, request, response):
+        if response.headers.get('Content-Encoding') == 'gzip':
+            headers = response.headers
+            del headers['Content-Encoding']
+            del headers['Content-Length']
+            decompressed = urllib.response.addinfourl(
+                gzip.GzipFile(fileobj=response), headers,
+                response.url, response.code
+            )
+            decompressed.msg = response.msg
+            response = decompressed
+        return response
+
+    https_request = http_request
+    https_response = http_response
+
+
+# number of active `gzip_efetch_responses` contexts and the original
+# urllib of Entrezpy's requester, restored when the last one exits
+_GZIP_LOCK = threading.Lock()
+_GZIP_STATE = {'users': 0, 'urllib': None}
+
+
+@contextmanager
+def gzip_efetch_responses():
+    """Makes Entrezpy request compressed EFetch responses within the context.
+
+    Only the urllib functions used by Entrezpy's requester are replaced
+    (and restored on exit) - the process-wide urllib opener, used by all
+    the other libraries, is left untouched. Contexts may be nested or
+    overlap (e.g., in concurrent actions): the replacement is installed by
+    the first one to enter and only removed by the last one to exit.
+    """
+    with _GZIP_LOCK:
+        if not _GZIP_STATE['users']:
+            opener = urllib.request.build_opener(_GzipEFetchHandler())
+            _GZIP_STATE['urllib'] = requester.urllib
+            requester.urllib = SimpleNamespace(
+                request=SimpleNamespace(
+                    Request=urllib.request.Request, urlopen=opener.open
+                ),
+                parse=urllib.parse, error=urllib.error
+            )
+        _GZIP_STATE['users'] += 1
+    try:
+        yield
+    finally:
+        with _GZIP_LOCK:
+            _GZIP_STATE['users'] -= 1
+            if not _GZIP_STATE['users']:
+                requester.urllib = _GZIP_STATE['urllib']
+                _GZIP_STATE['urllib'] = None
@@ -9,15 +9,10 @@
 import qiime2 as q2
 
 import pandas as pd
-import threading
 
-from q2_fondue.utils import handle_threaded_exception
 from qiime2 import Artifact
 
 
-threading.excepthook = handle_threaded_exception
-
-
 def get_all(
         ctx, accession_ids, email, n_jobs=1, retries=2, log_level='INFO',
         linked_doi=None):
@@ -41,7 +36,9 @@ def get_all(
         run_ids, email, retries, n_jobs, log_level
     )
     failed_ids_df = pd.concat(
-        [failed_ids_df, failed_ids.view(pd.DataFrame)])
+        [failed_ids_df, failed_ids.view(pd.DataFrame)],
+        copy=False, sort=False
+    )
     if failed_ids_df.shape[0] > 0:
         failed_ids = Artifact.import_data('SRAFailedIDs', failed_ids_df)
 
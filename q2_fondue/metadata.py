@@ -7,6 +7,8 @@
 # ----------------------------------------------------------------------------
 
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
 
 import entrezpy.efetch.efetcher as ef
@@ -16,14 +18,19 @@ from qiime2 import Metadata
 from q2_fondue.entrezpy_clients._efetch import EFetchAnalyzer
 from q2_fondue.utils import (
     _validate_run_ids, _determine_id_type, handle_threaded_exception,
+    _chunker, _RateLimiter, _backoff_delay
 )
 from q2_fondue.entrezpy_clients._utils import (set_up_entrezpy_logging,
-                                               set_up_logger, InvalidIDs)
+                                               set_up_logger, InvalidIDs,
+                                               gzip_efetch_responses)
 from q2_fondue.entrezpy_clients._pipelines import _get_run_ids
 
-
-threading.excepthook = handle_threaded_exception
 BATCH_SIZE = 150
+EFETCH_RETRIES = 2
+# minimal delay (in seconds) before every retry - the maximal one is
+# doubled with every retry up to EFETCH_BACKOFF_CAP (see `_backoff_delay`)
+EFETCH_BACKOFF = 0.2
+EFETCH_BACKOFF_CAP = 5
 
 
 def _efetcher_inquire(
@@ -56,25 +63,76 @@ def _efetcher_inquire(
         return (pd.DataFrame(),
                 {m_id: metadata_response.error_msg for m_id in run_ids})
     else:
-        return metadata_response.result.metadata_to_df(), {}
+        # IDs can be missing e.g. when the response was truncated
+        fetched_ids = metadata_response.result.runs
+        missing_ids = {
+            m_id: 'ID was not found in the EFetch response.'
+            for m_id in run_ids if m_id not in fetched_ids
+        }
+        return metadata_response.result.metadata_to_df(), missing_ids
 
 
 def _execute_efetcher(email, n_jobs, run_ids, log_level):
-    efetcher = ef.Efetcher(
-        'efetcher', email, apikey=None,
-        apikey_var=None, threads=n_jobs, qid=None
-    )
-    set_up_entrezpy_logging(efetcher, log_level)
+    """Fetches metadata for all the run IDs in concurrent batches.
+
+    Run IDs are split into chunks of BATCH_SIZE which are fetched in
+    parallel by up to `n_jobs` threads, all of them sharing a single rate
+    limiter to stay within NCBI's request limit. Every batch is fetched
+    with its own Efetcher: an Entrezpy client can only run one query and
+    it installs a SIGINT handler when created, which is only possible in
+    the main thread - all the clients are therefore created up front.
+
+    Args:
+        email (str): A valid e-mail address.
+        n_jobs (int): Number of threads to be used in parallel.
+        run_ids (List[str]): List of all the run IDs to be fetched.
+        log_level (str): Logging level.
+
+    Returns:
+        List[pd.DataFrame]: DataFrames with metadata obtained for the
+            provided IDs (one per non-empty batch).
+        dict: Dictionary of the run IDs that were not found with
+            respective error messages.
+    """
+    def _create_efetcher():
+        efetcher = ef.Efetcher(
+            'efetcher', email, apikey=None,
+            apikey_var=None, threads=0, qid=None
+        )
+        set_up_entrezpy_logging(efetcher, log_level)
+        return efetcher
+
+    def _fetch_batch(efetcher, batch):
+        rate_limiter.wait()
+        return _efetcher_inquire(efetcher, batch, log_level)
 
-    return _efetcher_inquire(efetcher, run_ids, log_level)
+    batches = list(_chunker(run_ids, BATCH_SIZE))
+    n_workers = max(min(n_jobs, len(batches)), 1)
+    rate_limiter = _RateLimiter()
+    efetchers = [_create_efetcher() for _ in batches]
+    with gzip_efetch_responses(), \
+            ThreadPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(_fetch_batch, efetchers, batches))
+
+    meta_dfs, missing_ids = [], {}
+    for meta_df, missing in results:
+        if not meta_df.empty:
+            meta_dfs.append(meta_df)
+        missing_ids.update(missing)
+
+    return meta_dfs, missing_ids
 
 
 def _get_run_meta(
         email, n_jobs, run_ids, validated, log_level, logger
 ) -> (pd.DataFrame, dict):
     if not validated:
-        invalid_ids = _validate_run_ids(email, n_jobs, run_ids, log_level)
-        valid_ids = sorted(list(set(run_ids) - set(invalid_ids.keys())))
+        invalid_ids = _validate_run_ids(
+            email, n_jobs, run_ids, log_level
+        )
+        valid_ids = [
+            _id for _id in dict.fromkeys(run_ids) if _id not in invalid_ids
+        ]
 
         if not valid_ids:
             raise InvalidIDs(
@@ -92,11 +150,39 @@ def _get_run_meta(
         # since we asked NCBI to get those for us
         valid_ids = run_ids
 
-    # fetch metadata
+    # fetch metadata - IDs which could not be fetched are retried,
+    # up to EFETCH_RETRIES times
     logger.info('Fetching metadata for %i run IDs.', len(valid_ids))
-    meta_df, missing_ids = _execute_efetcher(
-        email, n_jobs, valid_ids, log_level
-    )
+    meta_dfs, ids_to_fetch = [], valid_ids
+    for attempt in range(EFETCH_RETRIES + 1):
+        if attempt > 0:
+            logger.info(
+                'Retrying to fetch metadata for %i run IDs (retry %i/%i).',
+                len(ids_to_fetch), attempt, EFETCH_RETRIES
+            )
+            time.sleep(
+                _backoff_delay(attempt, EFETCH_BACKOFF, EFETCH_BACKOFF_CAP))
+        batch_dfs, missing_ids = _execute_efetcher(
+            email, n_jobs, ids_to_fetch, log_level
+        )
+        meta_dfs.extend(batch_dfs)
+        if not missing_ids:
+            break
+        if attempt > 0 and len(missing_ids) >= len(ids_to_fetch):
+            # the retry did not fetch anything - further ones are
+            # unlikely to do any better
+            logger.info(
+                'Retrying made no progress - metadata for the remaining '
+                '%i run IDs will not be fetched again.', len(missing_ids)
+            )
+            break
+        ids_to_fetch = list(missing_ids.keys())
+
+    # concatenate all the batches from all the attempts at once
+    if meta_dfs:
+        meta_df = pd.concat(meta_dfs, axis=0, copy=False, sort=False)
+    else:
+        meta_df = pd.DataFrame()
 
     if missing_ids:
         logger.warning(
@@ -131,8 +217,9 @@ def _find_doi_mapping_and_type(
         str: Type of accession IDs in matching.
     """
     id2doi = mapping_doi_ids.to_dataframe().iloc[:, 0]
-    doi_ids = sorted(list(mapping_doi_ids.get_ids()))
-    id2doi_type = _determine_id_type(doi_ids)
+    # re-use the index of the materialized table instead of asking the
+    # Metadata object for its IDs again - ID type does not depend on order
+    id2doi_type = _determine_id_type(id2doi.index)
 
     return (id2doi, id2doi_type)
 
@@ -140,15 +227,16 @@ def _find_doi_mapping_and_type(
 def get_metadata(
         accession_ids: Metadata, email: str,
         n_jobs: int = 1, log_level: str = 'INFO',
-        linked_doi: Metadata = None
+        linked_doi: Metadata = None, validate_ids: bool = True
 ) -> (pd.DataFrame, pd.DataFrame):
     """Fetches metadata using the provided run/bioproject/study/sample or
     experiment accession IDs.
 
     If aggregate IDs (such as bioproject, study, sample, experiment IDs) were
     provided, first run IDs will be fetched using a Conduit Pipeline.
-    The run IDs will be validated using an ESearch query. The metadata will
-    be fetched only for the valid run IDs. Invalid run IDs will be raised
+    The run IDs will be validated using an ESearch query, unless
+    `validate_ids` is False. The metadata will be fetched only for the
+    valid run IDs. Invalid run IDs will be raised
     with a warning. Run IDs for which the metadata could not be fetched will
     be returned with the corresponding error message as missing_ids.
 
@@ -165,12 +253,17 @@ def get_metadata(
         email (str): A valid e-mail address (required by NCBI).
         n_jobs (int, default=1): Number of threads to be used in parallel.
         log_level (str, default='INFO'): Logging level.
+        validate_ids (bool, default=True): Whether the provided run IDs
+            should be validated before fetching metadata. Validation can
+            be skipped for trusted IDs (e.g., obtained from a previous
+            successful fetch).
 
     Returns:
         pd.DataFrame: DataFrame with metadata obtained for the provided IDs.
         pd.DataFrame: DataFrame with runs IDs for which no metadata was
             fetched and the associated error messages.
     """
+    threading.excepthook = handle_threaded_exception
     logger = set_up_logger(log_level, logger_name=__name__)
 
     # extract DOI names to IDs mapping for later
@@ -181,8 +274,8 @@ def get_metadata(
     else:
         id2doi, id2doi_type = None, None
 
-    # Retrieve input IDs
-    accession_ids = sorted(list(accession_ids.get_ids()))
+    # Retrieve input IDs - Metadata IDs are unique and ordered already
+    accession_ids = list(accession_ids.ids)
 
     # figure out which id type we're dealing with
     id_type = _determine_id_type(accession_ids)
@@ -190,7 +283,7 @@ def get_metadata(
     # get actual metadata
     if id_type == 'run':
         meta, missing_ids = _get_run_meta(
-            email, n_jobs, accession_ids, False, log_level, logger
+            email, n_jobs, accession_ids, not validate_ids, log_level, logger
         )
     else:
         meta, missing_ids = _get_other_meta(
@@ -203,16 +296,13 @@ def get_metadata(
         'experiment': 'Experiment ID', 'sample': 'Sample Accession'
     }
     if id2doi is not None and id2doi_type == 'run':
-        meta = meta.join(id2doi, how='left')
+        meta[id2doi.name] = meta.index.map(id2doi)
     elif id2doi is not None and id2doi_type != 'run':
-        meta = meta.merge(id2doi, how='left',
-                          left_on=match_study_meta[id2doi_type],
-                          right_index=True)
+        meta[id2doi.name] = meta[match_study_meta[id2doi_type]].map(id2doi)
 
-    missing_ids = pd.DataFrame(
-        data={'Error message': missing_ids.values()},
-        index=pd.Index(missing_ids.keys(), name='ID')
-    )
+    missing_ids = pd.DataFrame.from_dict(
+        missing_ids, orient='index', columns=['Error message']
+    ).rename_axis('ID')
     return meta, missing_ids
 
 
@@ -230,17 +320,31 @@ def merge_metadata(
     logger = set_up_logger('INFO', logger_name=__name__)
     logger.info('Merging %s metadata DataFrames.', len(metadata))
 
-    metadata_merged = pd.concat(metadata, axis=0, join='outer')
+    # align all the frames to the union of columns (in order of appearance)
+    # up front so that concat does not need to re-align them one by one
+    columns = list(dict.fromkeys(col for df in metadata for col in df.columns))
+    metadata = [df.reindex(columns=columns) for df in metadata]
+    metadata_merged = pd.concat(
+        metadata, axis=0, join='outer', copy=False, sort=False
+    )
 
-    records_count = metadata_merged.shape[0]
-    metadata_merged.drop_duplicates(inplace=True)
-    if records_count != metadata_merged.shape[0]:
-        logger.info(
-            '%s duplicate record(s) found in the metadata '
-            'were dropped.', records_count - metadata_merged.shape[0]
-        )
+    # only records sharing their ID with another record can be duplicates,
+    # so compare full rows just within that (usually small) subset
+    shared_ids = metadata_merged.index.duplicated(keep=False)
+    if shared_ids.any():
+        positions = shared_ids.nonzero()[0]
+        duplicated = metadata_merged.iloc[positions]\
+            .reset_index().duplicated(keep='first').to_numpy()
+        to_keep = ~shared_ids
+        to_keep[positions[~duplicated]] = True
+        if duplicated.any():
+            metadata_merged = metadata_merged[to_keep]
+            logger.info(
+                '%s duplicate record(s) found in the metadata '
+                'were dropped.', duplicated.sum()
+            )
 
-    if len(metadata_merged.index) != len(set(metadata_merged.index)):
+    if not metadata_merged.index.is_unique:
         logger.warning(
             'Records with same IDs but differing values were found in '
             'the metadata and will not be removed.'
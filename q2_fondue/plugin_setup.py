@@ -29,6 +29,12 @@ from q2_fondue.types._format import (
 )
 from q2_fondue.types._type import SRAMetadata, SRAFailedIDs, NCBIAccessionIDs
 
+POS_INT = Int % Range(1, None)
+NONNEG_INT = Int % Range(0, None)
+LOG_LEVEL = Str % Choices(['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+SINGLE_READS = SampleData[SequencesWithQuality]
+PAIRED_READS = SampleData[PairedEndSequencesWithQuality]
+
 common_inputs = {
     'accession_ids': NCBIAccessionIDs | SRAMetadata | SRAFailedIDs
 }
@@ -43,8 +49,8 @@ common_input_descriptions = {
 
 common_params = {
     'email': Str,
-    'n_jobs': Int % Range(1, None),
-    'log_level': Str % Choices(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
+    'n_jobs': POS_INT,
+    'log_level': LOG_LEVEL,
 }
 
 common_param_descr = {
@@ -53,6 +59,16 @@ common_param_descr = {
     'log_level': 'Logging level.'
 }
 
+retries_params = {
+    **common_params,
+    'retries': NONNEG_INT
+}
+
+retries_param_descr = {
+    **common_param_descr,
+    'retries': 'Number of retries to fetch sequences.'
+}
+
 input_descriptions = {
     'linked_doi': 'Optional table containing linked DOI names that is '
                   'only used if accession_ids does not contain any '
@@ -94,13 +110,22 @@ plugin.methods.register_function(
         **common_inputs,
         'linked_doi': NCBIAccessionIDs
     },
-    parameters=common_params,
+    parameters={
+        **common_params,
+        'validate_ids': Bool
+    },
     outputs=[('metadata', SRAMetadata), ('failed_runs', SRAFailedIDs)],
     input_descriptions={
         **common_input_descriptions,
         'linked_doi': input_descriptions['linked_doi']
     },
-    parameter_descriptions=common_param_descr,
+    parameter_descriptions={
+        **common_param_descr,
+        'validate_ids': 'Validate provided run IDs using ESearch before '
+                        'fetching their metadata. Can be disabled for '
+                        'trusted IDs, e.g. when re-fetching metadata of '
+                        'previously fetched runs.'
+    },
     output_descriptions={
         'metadata': output_descriptions['metadata'],
         'failed_runs': output_descriptions['failed_runs'].format('metadata')
@@ -119,19 +144,17 @@ plugin.methods.register_function(
     function=get_sequences,
     inputs={**common_inputs},
     parameters={
-        **common_params,
-        'retries': Int % Range(0, None),
+        **retries_params,
         'restricted_access': Bool
     },
     outputs=[
-        ('single_reads', SampleData[SequencesWithQuality]),
-        ('paired_reads', SampleData[PairedEndSequencesWithQuality]),
+        ('single_reads', SINGLE_READS),
+        ('paired_reads', PAIRED_READS),
         ('failed_runs', SRAFailedIDs)
     ],
     input_descriptions={**common_input_descriptions},
     parameter_descriptions={
-        **common_param_descr,
-        'retries': 'Number of retries to fetch sequences.',
+        **retries_param_descr,
         'restricted_access': 'If sequence fetch requires dbGaP repository '
         'key.'
     },
@@ -149,24 +172,18 @@ plugin.pipelines.register_function(
     function=get_all,
     inputs={**common_inputs,
             'linked_doi': NCBIAccessionIDs},
-    parameters={
-        **common_params,
-        'retries': Int % Range(0, None)
-    },
+    parameters=retries_params,
     outputs=[
         ('metadata', SRAMetadata),
-        ('single_reads', SampleData[SequencesWithQuality]),
-        ('paired_reads', SampleData[PairedEndSequencesWithQuality]),
+        ('single_reads', SINGLE_READS),
+        ('paired_reads', PAIRED_READS),
         ('failed_runs', SRAFailedIDs)
     ],
     input_descriptions={
         **common_input_descriptions,
         'linked_doi': input_descriptions['linked_doi']
     },
-    parameter_descriptions={
-        **common_param_descr,
-        'retries': 'Number of retries to fetch sequences.'
-    },
+    parameter_descriptions=retries_param_descr,
     output_descriptions={
         'metadata': output_descriptions['metadata'],
         'single_reads': output_descriptions['single_reads'],
@@ -202,11 +219,12 @@ plugin.methods.register_function(
 )
 
 T = TypeMatch([SequencesWithQuality, PairedEndSequencesWithQuality])
+SAMPLE_READS = SampleData[T]
 plugin.methods.register_function(
     function=combine_seqs,
-    inputs={'seqs': List[SampleData[T]]},
+    inputs={'seqs': List[SAMPLE_READS]},
     parameters={'on_duplicates': Str % Choices(['error', 'warn'])},
-    outputs=[('combined_seqs', SampleData[T])],
+    outputs=[('combined_seqs', SAMPLE_READS)],
     input_descriptions={
         'seqs': 'Sequence artifacts to be combined together.'
     },
@@ -233,7 +251,8 @@ plugin.methods.register_function(
     parameters={
         'collection_name': Str,
         'on_no_dois': Str % Choices(['ignore', 'error']),
-        'log_level': Str % Choices(['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+        'log_level': LOG_LEVEL,
+        'n_jobs': POS_INT
     },
     outputs=[('run_ids', NCBIAccessionIDs),
              ('study_ids', NCBIAccessionIDs),
@@ -244,7 +263,9 @@ plugin.methods.register_function(
     parameter_descriptions={
         'collection_name': 'Name of the collection to be scraped.',
         'on_no_dois': 'Behavior if no DOIs were found.',
-        'log_level': 'Logging level.'
+        'log_level': 'Logging level.',
+        'n_jobs': 'Number of attachments to be fetched and scraped '
+                  'concurrently.'
     },
     output_descriptions={
         'run_ids': output_scraper_txt.format('run'),
@@ -12,8 +12,6 @@ import pandas as pd
 from q2_fondue.utils import handle_threaded_exception
 from q2_fondue.entrezpy_clients._pipelines import _get_run_ids
 
-threading.excepthook = handle_threaded_exception
-
 
 def get_ids_from_query(
         query: str, email: str,
@@ -32,6 +30,8 @@ def get_ids_from_query(
     Returns:
         ids (pd.Series): Retrieved SRA run IDs.
     """
+    threading.excepthook = handle_threaded_exception
+
     run_ids = _get_run_ids(
         email, n_jobs, None, query, 'biosample', log_level
     )
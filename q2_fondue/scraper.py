@@ -5,20 +5,68 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import hashlib
 import os
-import dotenv
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import pandas as pd
 from pyzotero import zotero, zotero_errors
-from q2_fondue.entrezpy_clients._utils import set_up_logger
+from q2_fondue.entrezpy_clients._utils import (set_up_logger,
+                                               set_log_level)
+from q2_fondue.utils import _load_dotenv
 
 logger = set_up_logger('INFO', logger_name=__name__)
 
+# plain accession IDs of every type:
+# PREFIX12345 or PREFIX 12345 or PREFIX1 2345 (and variants thereof)
+ACCESSION_PATTERNS = {
+    'run': r'[EDS]RR\s?\d+\s?\d+', 'study': r'[EDS]RP\s?\d+\s?\d+',
+    'bioproject': r'PRJ[EDN][A-Z]\s?\d+\s?\d+',
+    'experiment': r'[EDS]RX\s?\d+\s?\d+',
+    'sample': r'[EDS]RS\s?\d+\s?\d+',
+}
+ACCESSION_REGEXES = {
+    id_type: re.compile(pattern)
+    for id_type, pattern in ACCESSION_PATTERNS.items()
+}
+# plain accession IDs of all types at once, named by their type
+ANY_ACCESSION_REGEX = re.compile('|'.join(
+    f'(?P<{id_type}>{pattern})'
+    for id_type, pattern in ACCESSION_PATTERNS.items()
+))
+# accession IDs followed by up to 10 comma-separated numbers and/or
+# "and" with a number: PREFIX12345, 56789 and 67899
+ACCESSION_LIST_REGEXES = {
+    id_type: re.compile(pattern + r'((?:,\s\d+){0,10})(?:\sand\s(\d+))?')
+    for id_type, pattern in ACCESSION_PATTERNS.items()
+}
+# source of hyphens: https://stackoverflow.com/a/48923796 with \u00ad added
+HYPHENS = (
+    r'[\u002D\u058A\u05BE\u1400\u1806\u2010-\u2015\u2E17\u2E1A'
+    r'\u2E3A\u2E3B\u2E40\u301C\u3030\u30A0\uFE31\uFE32\uFE58\uFE63'
+    r'\uFF0D\u00AD]'
+)
+PREFIX_REGEX = re.compile('[A-Z]+')
+# character prefix and digits of an accession ID (without whitespace)
+ID_PARTS_REGEX = re.compile(r'([A-Z]+)(\d+)')
+DOI_REGEX = re.compile(r'10\.\d+/[-;()\w.]+')
+ARXIV_REGEX = re.compile(r'https*://arxiv.org/abs/(.*)')
+
 
 class NoAccessionIDs(Exception):
     pass
 
 
+@lru_cache(maxsize=None)
+def _compile_pattern(pattern: str) -> re.Pattern:
+    """Compiles `pattern` only once, as the same combinations of accession
+    ID patterns are searched for in every attachment."""
+    return re.compile(pattern)
+
+
 def _get_collection_id(zot: zotero.Zotero, col_name: str) -> str:
     """
     Returns collection ID given the name of a Zotero collection
@@ -57,15 +105,11 @@ def _find_doi_in_extra(item: dict) -> str:
     Returns:
         str: DOI
     """
-    doi_regex = r'10\.\d+/[-;()\w.]+'
-    if 'extra' in item['data'].keys():
-        doi_id = re.findall(doi_regex, item['data']['extra'])
-        if len(doi_id) > 0:
-            return doi_id[0]
-        else:
-            return ''
-    else:
+    extra = item['data'].get('extra')
+    if not extra:
         return ''
+    doi_id = DOI_REGEX.search(extra)
+    return doi_id.group() if doi_id else ''
 
 
 def _find_doi_in_arxiv_url(item: dict) -> str:
@@ -77,17 +121,11 @@ def _find_doi_in_arxiv_url(item: dict) -> str:
     Returns:
         str: DOI
     """
-    reg_arxiv_id = r'https*://arxiv.org/abs/(.*)'
-    if 'url' in item['data'].keys():
-        arxiv_id = re.findall(reg_arxiv_id, item['data']['url'])
-
-        if len(arxiv_id) > 0:
-            doi_prefix = '10.48550/arXiv.'
-            return [doi_prefix+x for x in arxiv_id][0]
-        else:
-            return ''
-    else:
+    url = item['data'].get('url')
+    if not url:
         return ''
+    arxiv_id = ARXIV_REGEX.search(url)
+    return f'10.48550/arXiv.{arxiv_id.group(1)}' if arxiv_id else ''
 
 
 def _get_parent_and_doi(items: list, on_no_dois: str = 'ignore') -> dict:
@@ -103,24 +141,20 @@ def _get_parent_and_doi(items: list, on_no_dois: str = 'ignore') -> dict:
     """
     parent_doi = {}
     for item in items:
-        item_key = item['key']
-
-        # fetch DOI for items with field DOI (e.g. JournalArticles)
-        doi = item['data'].get('DOI', '')
-        parent_doi.update({item_key: doi}) if doi else False
-
-        # fetch DOI with "Extra" field and a DOI within (e.g. Reports from
-        # bioRxiv and medRxiv, Books)
-        doi = _find_doi_in_extra(item)
-        parent_doi.update({item_key: doi}) if doi else False
-
-        # if arXiv ID present - create DOI from it as described in
-        # https://blog.arxiv.org/2022/02/17/new-arxiv-articles-are-
-        # now-automatically-assigned-dois/
-        doi = _find_doi_in_arxiv_url(item)
-        parent_doi.update({item_key: doi}) if doi else False
-
-    if len(parent_doi) == 0 and on_no_dois == 'error':
+        # sources are checked in order of precedence and the remaining ones
+        # are skipped as soon as a DOI is found:
+        # - if arXiv ID present - create DOI from it as described in
+        #   https://blog.arxiv.org/2022/02/17/new-arxiv-articles-are-
+        #   now-automatically-assigned-dois/
+        # - DOI within "Extra" field (e.g. Reports from bioRxiv and medRxiv,
+        #   Books)
+        # - DOI field (e.g. JournalArticles)
+        doi = _find_doi_in_arxiv_url(item) or _find_doi_in_extra(item) or \
+            item['data'].get('DOI', '')
+        if doi:
+            parent_doi[item['key']] = doi
+
+    if not parent_doi and on_no_dois == 'error':
         raise KeyError(
             'This collection has no items with associated DOI names.')
     return parent_doi
@@ -135,32 +169,33 @@ def _get_attachment_keys(items: list) -> list:
     Returns:
         list: List of attachment keys.
     """
-    attach = [x for x in items if x['data']['itemType'] == 'attachment']
-    if len(attach) == 0:
+    attach_keys = {
+        x['key'] for x in items if x['data']['itemType'] == 'attachment'
+    }
+    if not attach_keys:
         raise KeyError(
             'No attachments exist in this collection')
-    else:
-        attach_keys = sorted(list(set([x['key'] for x in attach])))
-        return attach_keys
+    # sorted, as the order in which attachments are scraped determines
+    # the order of DOI names linked to each accession ID
+    return sorted(attach_keys)
 
 
 def _link_attach_and_doi(
-        items: list, attach_key: str, parent_doi: dict,
+        items_by_key: dict, attach_key: str, parent_doi: dict,
         on_no_dois: str = 'ignore') -> str:
     """
-    Matches given `attach_key` in `items` to corresponding DOI name
+    Matches given `attach_key` in `items_by_key` to corresponding DOI name
     linked via parent ID in `parent_doi` dictionary.
 
     Args:
-        items (list): List of Zotero items.
+        items_by_key (dict): Zotero items by their keys.
         attach_key (str): Key of attachment to be matched.
         parent_doi (dict): Known parent ID and DOI matches.
 
     Returns:
         str: Matching DOI name
     """
-    attach_item = [x for x in items if x['key'] == attach_key]
-    parent_key = attach_item[0]['data']['parentItem']
+    parent_key = items_by_key[attach_key]['data']['parentItem']
     if parent_key not in parent_doi and on_no_dois == 'error':
         raise KeyError(
             f'Attachment {attach_key} does not contain a matching DOI '
@@ -193,27 +228,43 @@ def _expand_dict(id_dict: dict, keys: list, value2link: str) -> dict:
     return id_dict
 
 
-def _find_special_id(txt: str, pattern: str, split_str: str) -> list:
-    """Creates an accession ID from starting characters in `pattern` and
-    digits following `split_str` in `txt`.
+def _doi_dict_to_dataframe(doi_dict: dict) -> pd.DataFrame:
+    """Converts accession IDs and their linked DOI names to a DataFrame.
+
+    Args:
+        doi_dict (dict): DOI names linked to each accession ID.
+
+    Returns:
+        pd.DataFrame: DataFrame with DOI names (column 'DOI') indexed
+            by accession IDs.
+    """
+    return pd.DataFrame(
+        {'DOI': list(doi_dict.values())},
+        index=pd.Index(list(doi_dict.keys()), name='ID', dtype=object),
+        dtype=object
+    )
+
+
+def _find_listed_ids(txt: str, id_type: str) -> list:
+    """Creates accession IDs from the digits listed after an accession ID
+    of `id_type` in `txt` and the character prefix of that ID, e.g.
+    "PREFIX12345, 56789 and 67899" yields "PREFIX56789, PREFIX67899".
 
     Args:
-        txt (str): Text to search for ID
-        pattern (str): Pattern containing at the start the character prefix and
-                       at the end the remaining digits of the accession ID
-        split_str (str): String separating the digit part of the ID
+        txt (str): Text to search for IDs.
+        id_type (str): Type of ID to search for.
 
     Returns:
-        list: List with accession ID.
+        list: List with accession IDs (without the leading ID).
     """
-    match = re.findall(f'({pattern})', txt)
     ids = []
-    if len(match) != 0:
-        for match in match:
-            split_match = match.split(split_str)
-            prefix = re.findall("[A-Z]+", split_match[0])[0]
-            number = split_match[-1].strip()
-            ids += [prefix + number]
+    for match in ACCESSION_LIST_REGEXES[id_type].finditer(txt):
+        commas, after_and = match.groups()
+        prefix = PREFIX_REGEX.match(match.group()).group()
+        numbers = commas.split(',')[1:] if commas else []
+        if after_and:
+            numbers.append(after_and)
+        ids.extend(prefix + number.strip() for number in numbers)
     return ids
 
 
@@ -233,39 +284,37 @@ def _find_hyphen_sequence(
     Returns:
         list: List of accession IDs with hyphenated IDs included.
     """
-    # source of hyphens: https://stackoverflow.com/a/48923796 with \u00ad added
-    hyphens_1 = r'[\u002D\u058A\u05BE\u1400\u1806\u2010-\u2015\u2E17\u2E1A'
-    hyphens_2 = r'\u2E3A\u2E3B\u2E40\u301C\u3030\u30A0\uFE31\uFE32\uFE58\uFE63'
-    hyphens_3 = r'\uFF0D\u00AD]'
-    hyphens = hyphens_1 + hyphens_2 + hyphens_3
-    pattern_hyphen = pattern + r'\s*' + hyphens + r'\s*' + after_hyphen
+    pattern_hyphen = \
+        f'({pattern})' + r'\s*' + HYPHENS + r'\s*' + f'({after_hyphen})'
     ids = []
-    matches = re.findall(f'({pattern_hyphen})', txt)
-    if len(matches) > 0:
-        for match in matches:
-            split_match = re.split(hyphens, match)
-
-            if after_hyphen == r'\d+':
-                # 3.a) "SRX100006-7" > "SRX100006, SRX100007"
-                nb_digits = len(split_match[-1])
-                base = split_match[0][:-nb_digits]
-                start = split_match[0][-nb_digits:]
-                end = split_match[-1][-nb_digits:]
-            elif after_hyphen == pattern:
-                # 3.b) "SRX100006-SRX100007" > "SRX100006, SRX100007"
-                prefix_digit_split = re.split(r'(\d+)', split_match[0])
-                base = prefix_digit_split[0]
-                start = prefix_digit_split[1]
-                nb_digits = len(start)
-                end = re.split(r'(\d+)', split_match[-1])[1]
-
-            for i in range(int(start), int(end) + 1):
-                filling_zeros = nb_digits - len(str(i))
-                ids += [base + filling_zeros * str(0) + str(i)]
+    for match in _compile_pattern(pattern_hyphen).finditer(txt):
+        # remove potential whitespace (as in plain accession IDs)
+        first, last = (x.replace(' ', '') for x in match.groups())
+
+        if after_hyphen == r'\d+':
+            # 3.a) "SRX100006-7" > "SRX100006, SRX100007"
+            nb_digits = len(last)
+            base, start = first[:-nb_digits], first[-nb_digits:]
+            end = last
+            if not start.isdigit():
+                # more digits after the hyphen than in the ID itself
+                continue
+        elif after_hyphen == pattern:
+            # 3.b) "SRX100006-SRX100007" > "SRX100006, SRX100007"
+            base, start = ID_PARTS_REGEX.match(first).groups()
+            nb_digits = len(start)
+            end = ID_PARTS_REGEX.match(last).group(2)
+
+        # zero-padded to the width of the first ID's digits
+        ids.extend(
+            f'{base}{i:0{nb_digits}d}'
+            for i in range(int(start), int(end) + 1)
+        )
     return ids
 
 
-def _find_accession_ids(txt: str, id_type: str) -> list:
+def _find_accession_ids(
+        txt: str, id_type: str, plain_ids: list = None) -> list:
     """Returns list of run, study, BioProject, experiment and
     sample IDs found in `txt`.
 
@@ -282,78 +331,140 @@ def _find_accession_ids(txt: str, id_type: str) -> list:
         txt (str): Some text to search
         id_type (str): Type of ID to search for 'run', 'study', 'bioproject',
         'experiment' or 'sample'.
+        plain_ids (list): Plain IDs of `id_type` already found in `txt`
+        (e.g., by `_find_all_accession_ids`) - searched for if not given.
 
     Returns:
         list: List of run, study, BioProject, experiment or sample IDs found.
     """
-    # DEFAULT: Find plain accession ID:
-    # PREFIX12345 or PREFIX 12345 or PREFIX1 2345 (and variants thereof)
-    patterns = {
-        'run': r'[EDS]RR\s?\d+\s?\d+', 'study': r'[EDS]RP\s?\d+\s?\d+',
-        'bioproject': r'PRJ[EDN][A-Z]\s?\d+\s?\d+',
-        'experiment': r'[EDS]RX\s?\d+\s?\d+',
-        'sample': r'[EDS]RS\s?\d+\s?\d+',
-    }
-    pattern = patterns[id_type]
-
-    ids = re.findall(f'({pattern})', txt)
-    # remove potential whitespace
-    ids = [x.replace(' ', '') for x in ids]
-
-    # SPECIAL case 1: get IDs after comma:
-    # "PREFIX12345, 56789" yields "PREFIX56789"
-    for nb_comma in range(1, 11):
-        pattern_comma = pattern + nb_comma * r',\s\d+'
-        ids_match = _find_special_id(txt, pattern_comma, ',')
-        if len(ids_match) == 0:
-            pattern_comma = pattern + (nb_comma - 1) * r',\s\d*'
-            break
-        else:
-            ids += ids_match
-
-    # SPECIAL case 2: get IDs after and:
-    # "PREFIX12345, 56789 and 67899" yields "PREFIX67899"
-    pattern_and = pattern_comma + r'\sand\s\d+'
-    ids += _find_special_id(txt, pattern_and, 'and')
+    # DEFAULT: Find plain accession ID (see ACCESSION_PATTERNS)
+    pattern = ACCESSION_PATTERNS[id_type]
+
+    if plain_ids is None:
+        plain_ids = ACCESSION_REGEXES[id_type].findall(txt)
+    # all the special cases below extend the plain pattern, so they cannot
+    # match if there is no plain accession ID in the text at all
+    if not plain_ids:
+        return []
+    # remove potential whitespace - IDs are collected in a set right away,
+    # as e.g. hyphenated sequences below include the IDs they start with
+    ids = {x.replace(' ', '') for x in plain_ids}
+
+    # SPECIAL cases 1 & 2: get IDs after comma and after and:
+    # "PREFIX12345, 56789 and 67899" yields "PREFIX56789, PREFIX67899"
+    ids.update(_find_listed_ids(txt, id_type))
 
     # SPECIAL case 3: hyphenated sequence of IDs
     # "SRX100006-7" and "SRX100006-SRX100007" both yield "SRX100006, SRX100007"
     for after_hyphen_pattern in [r'\d+', pattern]:
-        ids += _find_hyphen_sequence(txt, pattern, after_hyphen_pattern)
+        ids.update(_find_hyphen_sequence(txt, pattern, after_hyphen_pattern))
+
+    return list(ids)
+
+
+def _find_all_accession_ids(txt: str, id_types: list) -> dict:
+    """Returns accession IDs of all `id_types` found in `txt`.
+
+    Plain IDs of all the types are found in a single pass over `txt`.
+
+    Args:
+        txt (str): Some text to search.
+        id_types (list): Types of accession IDs to search for.
+
+    Returns:
+        dict: Accession IDs found in `txt`, per ID type.
+    """
+    plain_ids = {id_type: [] for id_type in id_types}
+    for match in ANY_ACCESSION_REGEX.finditer(txt):
+        if match.lastgroup in plain_ids:
+            plain_ids[match.lastgroup].append(match.group())
+
+    return {
+        id_type: _find_accession_ids(txt, id_type, plain_ids[id_type])
+        for id_type in id_types
+    }
 
-    return list(set(ids))
+
+def _scrape_attachment(
+        zot: zotero.Zotero, attach_key: str, id_types: list,
+        found_ids: dict = None
+) -> dict:
+    """Fetches full text of an attachment and finds all accession IDs
+    of the requested types in it.
+
+    Args:
+        zot (zotero.Zotero): Zotero instance.
+        attach_key (str): Key of the attachment to be scraped.
+        id_types (list): Types of accession IDs to search for.
+        found_ids (dict, optional): Accession IDs found in the previously
+            scraped attachments, keyed by a digest of their text - updated
+            in place. Attachments of the same collection often share their
+            text (e.g., a PDF and its HTML snapshot or empty attachments),
+            which is then only searched once.
+
+    Returns:
+        dict: Accession IDs found in the attachment, per ID type.
+    """
+    try:
+        str_text = zot.fulltext_item(attach_key)['content']
+        # remove the soft hyphen, see https://stackoverflow.com/a/51976543
+        str_text = str_text.replace('\xad', '')
+    except zotero_errors.ResourceNotFound:
+        str_text = ''
+        logger.warning(f'Item {attach_key} doesn\'t contain any '
+                       f'full-text content or this item was not '
+                       f'synchronized correctly.')
+
+    if found_ids is None:
+        return _find_all_accession_ids(str_text, id_types)
+
+    # the full text may contain lone surrogates
+    digest = hashlib.sha256(
+        str_text.encode('utf-8', 'surrogatepass')).digest()
+    if digest not in found_ids:
+        found_ids[digest] = _find_all_accession_ids(str_text, id_types)
+    # hand out copies, so that the memoized IDs cannot be modified
+    return {id_type: list(ids) for id_type, ids in found_ids[digest].items()}
 
 
 def scrape_collection(
-    collection_name: str, on_no_dois: str = 'ignore', log_level: str = 'INFO'
+    collection_name: str, on_no_dois: str = 'ignore', log_level: str = 'INFO',
+    n_jobs: int = 1
 ) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame):
     """
     Scrapes Zotero collection for accession IDs (run, study, BioProject,
     experiment and sample) and associated DOI names.
 
+    Attachments are fetched and scraped by up to `n_jobs` threads.
+
     Args:
         collection_name (str): Name of the collection to be scraped.
         on_no_dois (str): Behavior if no DOIs were found.
         log_level (str, default='INFO'): Logging level.
+        n_jobs (int, default=1): Number of attachments to be fetched and
+            scraped concurrently.
 
     Returns:
         (pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame):
         Dataframes with run, study, BioProject, experiment and sample IDs and
         associated DOI names scraped from Zotero collection.
     """
-    logger.setLevel(log_level.upper())
+    set_log_level(logger, log_level.upper())
 
-    dotenv.load_dotenv()
+    _load_dotenv()
 
     logger.info(
         f'Scraping accession IDs for collection "{collection_name}"...'
     )
 
+    def _create_zotero():
+        return zotero.Zotero(
+            os.getenv('ZOTERO_USERID'),
+            os.getenv('ZOTERO_TYPE'),
+            os.getenv('ZOTERO_APIKEY'))
+
     # initialise Zotero instance
-    zot = zotero.Zotero(
-        os.getenv('ZOTERO_USERID'),
-        os.getenv('ZOTERO_TYPE'),
-        os.getenv('ZOTERO_APIKEY'))
+    zot = _create_zotero()
 
     # get collection id
     coll_id = _get_collection_id(zot, collection_name)
@@ -375,40 +486,41 @@ def scrape_collection(
     doi_dicts = {'run': {}, 'study': {}, 'bioproject': {}, 'experiment': {},
                  'sample': {}}
 
-    for attach_key in attach_keys:
-        # get doi linked with this attachment key
-        doi = _link_attach_and_doi(items, attach_key, parent_doi, on_no_dois)
-
-        # get text
-        try:
-            str_text = zot.fulltext_item(attach_key)['content']
-            # remove the soft hyphen, see https://stackoverflow.com/a/51976543
-            str_text = str_text.replace('\xad', '')
-        except zotero_errors.ResourceNotFound:
-            str_text = ''
-            logger.warning(f'Item {attach_key} doesn\'t contain any '
-                           f'full-text content or this item was not '
-                           f'synchronized correctly.')
-
-        # find accession IDs
-        for id_type in doi_dicts.keys():
-            ids = _find_accession_ids(str_text, id_type)
-            # match found accession IDs with DOI
-            doi_dicts[id_type] = _expand_dict(doi_dicts[id_type], ids, doi)
-
-    if sum([len(v) for _, v in doi_dicts.items()]) == 0:
+    # get doi linked with each attachment key (before fetching any text,
+    # as a missing DOI might be an error)
+    items_by_key = {item['key']: item for item in items}
+    attach_dois = [
+        _link_attach_and_doi(items_by_key, attach_key, parent_doi, on_no_dois)
+        for attach_key in attach_keys
+    ]
+
+    # fetching full text is I/O-bound so attachments are processed
+    # concurrently - results are merged in the original order; pyzotero
+    # keeps the state of a request on the Zotero instance, so every
+    # worker thread needs an instance of its own
+    local = threading.local()
+    found_ids = {}
+
+    def scrape(attach_key):
+        if not hasattr(local, 'zot'):
+            local.zot = _create_zotero()
+        return _scrape_attachment(
+            local.zot, attach_key, list(doi_dicts.keys()), found_ids)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for doi, attach_ids in zip(
+                attach_dois, pool.map(scrape, attach_keys)):
+            for id_type, ids in attach_ids.items():
+                # match found accession IDs with DOI
+                doi_dicts[id_type] = _expand_dict(
+                    doi_dicts[id_type], ids, doi)
+
+    if not any(doi_dicts.values()):
         raise NoAccessionIDs(f'The provided collection {collection_name} does '
                              f'not contain any accession IDs.')
     for id_type in doi_dicts.keys():
-        if len(doi_dicts[id_type]) == 0:
+        if not doi_dicts[id_type]:
             logger.warning(f'The provided collection {collection_name} '
                            f'does not contain any {id_type} IDs')
 
-    dfs = []
-    for doi_dict in doi_dicts.values():
-        df = pd.DataFrame.from_dict([doi_dict]).transpose()
-        df.columns = ['DOI']
-        df.index.name = 'ID'
-        dfs.append(df)
-
-    return tuple(dfs)
+    return tuple(_doi_dict_to_dataframe(d) for d in doi_dicts.values())
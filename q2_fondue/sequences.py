@@ -12,7 +12,6 @@ from multiprocessing import Pool, Queue, Process, Manager, cpu_count
 
 import gzip
 import os
-import dotenv
 import re
 import shutil
 import subprocess
@@ -29,15 +28,19 @@ from q2_types.per_sample_sequences import \
 from tqdm import tqdm
 
 from q2_fondue.entrezpy_clients._pipelines import _get_run_ids
-from q2_fondue.entrezpy_clients._utils import set_up_logger
+from q2_fondue.entrezpy_clients._utils import (set_up_logger,
+                                               set_log_level)
 from q2_fondue.utils import (
     _determine_id_type, handle_threaded_exception, DownloadError,
-    _has_enough_space, _find_next_id, _rewrite_fastq
+    _has_enough_space, _find_next_id, _rewrite_fastq, _backoff_delay,
+    _load_dotenv
 )
 
-threading.excepthook = handle_threaded_exception
-
 LOGGER = set_up_logger('INFO', logger_name=__name__)
+# minimal delay (in seconds) before every download retry - the maximal one
+# is doubled with every retry up to FASTERQ_BACKOFF_CAP (see `_backoff_delay`)
+FASTERQ_BACKOFF = 60
+FASTERQ_BACKOFF_CAP = 300
 
 
 def _run_cmd_fasterq(
@@ -144,7 +147,10 @@ def _run_fasterq_dump_for_all(
 
         if len(failed_ids.keys()) > 0 and retries > 0:
             # log & add time buffer if we retry
-            sleep_lag = (1 / (retries + 1)) * 180
+            sleep_lag = _backoff_delay(
+                init_retries - retries + 1, FASTERQ_BACKOFF,
+                FASTERQ_BACKOFF_CAP
+            )
             ls_failed_ids = list(failed_ids.keys())
             LOGGER.info(
                 f'Retrying to download the following failed accession IDs in '
@@ -243,16 +249,15 @@ def _copy_to_casava(
     """Copies single/paired-end sequences to Casava directory.
 
     Downloaded sequence files (single- or paired-end) will be
-    copied from tmp_dir to casava_result_path.
+    compressed from tmp_dir to casava_result_path. The uncompressed
+    files are removed right away so that they do not take up space
+    needed by the downloads which are still running.
     """
-    fwd_path_in = os.path.join(tmp_dir, filenames[0])
-    fwd_path_out = os.path.join(casava_result_path, f'{filenames[0]}.gz')
-    _rewrite_fastq(fwd_path_in, fwd_path_out)
-
-    if len(filenames) > 1:
-        rev_path_in = os.path.join(tmp_dir, filenames[1])
-        rev_path_out = os.path.join(casava_result_path, f'{filenames[1]}.gz')
-        _rewrite_fastq(rev_path_in, rev_path_out)
+    for filename in filenames[:2]:
+        path_in = os.path.join(tmp_dir, filename)
+        path_out = os.path.join(casava_result_path, f'{filename}.gz')
+        _rewrite_fastq(path_in, path_out)
+        os.remove(path_in)
 
 
 def _write2casava_dir(
@@ -345,7 +350,8 @@ def get_sequences(
 
         failed_ids (pd.DataFrame): Run IDs that failed to download with errors.
     """
-    LOGGER.setLevel(log_level.upper())
+    threading.excepthook = handle_threaded_exception
+    set_log_level(LOGGER, log_level.upper())
 
     casava_out_single = CasavaOneEightSingleLanePerSampleDirFmt()
     casava_out_paired = CasavaOneEightSingleLanePerSampleDirFmt()
@@ -366,7 +372,7 @@ def get_sequences(
     with tempfile.TemporaryDirectory() as tmp_dir:
         # get dbGAP key for restricted access sequences
         if restricted_access:
-            dotenv.load_dotenv()
+            _load_dotenv()
             key_file = os.getenv('KEY_FILEPATH')
             if not os.path.isfile(key_file):
                 raise ValueError(
@@ -459,7 +465,8 @@ def combine_seqs(
     error_on_duplicates = True if on_duplicates == 'error' else False
 
     all_files = pd.concat(
-        objs=[seq_artifact.manifest for seq_artifact in seqs], axis=0
+        objs=[seq_artifact.manifest for seq_artifact in seqs], axis=0,
+        copy=False, sort=False
     )
 
     # exclude empty sequence files, in case any
@@ -7,12 +7,14 @@
 # ----------------------------------------------------------------------------
 
 import pandas as pd
+import io
 import unittest
 from pandas._testing import assert_frame_equal
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from q2_fondue.entrezpy_clients._efetch import EFetchResult
 from q2_fondue.entrezpy_clients._sra_meta import META_REQUIRED_COLUMNS
+from q2_fondue.entrezpy_clients._utils import rename_columns
 from q2_fondue.tests._utils import _TestPluginWithEntrezFakeComponents
 
 
@@ -202,6 +204,23 @@ class TestEfetchClients(_TestPluginWithEntrezFakeComponents):
                     'ENA-LAST-UPDATE [STUDY]': '2020-03-04'}
         self.assertDictEqual(exp_attr, obs_attr)
 
+    def test_efetch_extract_custom_attributes_error(self):
+        attr_dict = {'STUDY_ATTRIBUTES': {'STUDY_ATTRIBUTE': ['malformed']}}
+
+        with self.assertLogs(
+                'q2_fondue.entrezpy_clients._efetch', level='INFO') as cm:
+            with self.assertRaises(AttributeError):
+                self.efetch_result_single._extract_custom_attributes(
+                    attr_dict, level='study'
+                )
+
+        self.assertEqual(len(cm.output), 1)
+        self.assertIn(
+            'Exception has occurred when processing STUDY attributes',
+            cm.output[0]
+        )
+        self.assertNotIn('malformed', cm.output[0])
+
     def test_efetch_add_metadata_one_experiment_one_run(self):
         self.efetch_result_single.add_metadata(
             self.xml_to_response('single'), ['FAKEID1']
@@ -238,6 +257,23 @@ class TestEfetchClients(_TestPluginWithEntrezFakeComponents):
         self.assertEqual(2, self.efetch_result_single.size())
         self.assertFalse(self.efetch_result_single.isEmpty())
 
+    def test_efetch_add_metadata_truncated_response(self):
+        with self.xml_to_response('multi') as response:
+            first_package, _ = response.read().decode('utf-8').split(
+                '</EXPERIMENT_PACKAGE>', maxsplit=1)
+        truncated = io.StringIO(
+            first_package + '</EXPERIMENT_PACKAGE><EXPERIMENT_PACKAGE><EXP'
+        )
+
+        with self.assertLogs(
+                'q2_fondue.entrezpy_clients._efetch', level='WARNING') as cm:
+            self.efetch_result_single.add_metadata(
+                truncated, ['FAKEID1', 'FAKEID2'])
+
+        self.assertListEqual(self.efetch_result_single.metadata,
+                             ['FAKEID1'])
+        self.assertIn('could not be parsed completely', cm.output[0])
+
     def test_efetch_to_df(self):
         self.efetch_result_single.add_metadata(
             self.xml_to_response('multi'), ['FAKEID1', 'FAKEID2'])
@@ -246,6 +282,35 @@ class TestEfetchClients(_TestPluginWithEntrezFakeComponents):
         exp = self.generate_expected_df().sort_index(axis=1)
         assert_frame_equal(exp, obs)
 
+    @patch('q2_fondue.entrezpy_clients._efetch.rename_columns',
+           wraps=rename_columns)
+    def test_efetch_to_df_cached(self, patch_rename):
+        self.efetch_result_single.add_metadata(
+            self.xml_to_response('multi'), ['FAKEID1'])
+        obs_first = self.efetch_result_single.metadata_to_df()
+        assert_frame_equal(
+            obs_first, self.efetch_result_single.metadata_to_df())
+        self.assertEqual(patch_rename.call_count, 1)
+
+        self.efetch_result_single.add_metadata(
+            self.xml_to_response('multi'), ['FAKEID2'])
+        obs_second = self.efetch_result_single.metadata_to_df()
+        self.assertEqual(patch_rename.call_count, 2)
+        self.assertListEqual(['FAKEID1', 'FAKEID2'], obs_second.index.tolist())
+
+    def test_efetch_to_df_cached_not_modified(self):
+        self.efetch_result_single.add_metadata(
+            self.xml_to_response('multi'), ['FAKEID1'])
+        exp = self.efetch_result_single.metadata_to_df().copy(deep=True)
+
+        obs_first = self.efetch_result_single.metadata_to_df()
+        obs_first['New column'] = 'abc'
+        obs_first.rename(columns={'Bases': 'Renamed'}, inplace=True)
+        obs_first.iloc[0, 0] = 'modified'
+
+        obs_second = self.efetch_result_single.metadata_to_df()
+        assert_frame_equal(exp, obs_second)
+
     def test_efetch_to_df_duplicated_columns(self):
         cols = [
             'avg_spot_len', 'bases', 'bioproject_id', 'biosample_id',
@@ -33,7 +33,7 @@ from q2_fondue.metadata import (
 )
 from q2_fondue.tests._utils import _TestPluginWithEntrezFakeComponents
 from q2_fondue.utils import (
-    _validate_run_ids, _determine_id_type
+    _validate_run_ids, _determine_id_type, _determine_prefix_type
 )
 
 
@@ -122,6 +122,15 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
                 InvalidIDs, 'type of provided IDs is either not supported'):
             _determine_id_type(ids)
 
+    def test_determine_id_type_cached(self):
+        _determine_prefix_type.cache_clear()
+        obs1 = _determine_id_type(['SRR123', 'ERR456', 'SRR789'])
+        obs2 = _determine_id_type(['ERR000', 'SRR111'])
+
+        self.assertEqual(obs1, 'run')
+        self.assertEqual(obs2, 'run')
+        self.assertEqual(_determine_prefix_type.cache_info().hits, 1)
+
     def test_efetcher_inquire_single(self):
         with patch.object(Requester, 'request') as mock_request:
             mock_request.return_value = self.xml_to_response('single')
@@ -139,6 +148,19 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
         pd.testing.assert_frame_equal(
             exp_df.sort_index(axis=1), obs_df.sort_index(axis=1))
 
+    def test_efetcher_inquire_single_missing_id(self):
+        with patch.object(Requester, 'request') as mock_request:
+            mock_request.return_value = self.xml_to_response('single')
+            obs_df, obs_missing = _efetcher_inquire(
+                self.fake_efetcher, ['FAKEID1', 'FAKEID9'], 'INFO'
+            )
+
+        self.assertListEqual(['FAKEID1'], obs_df.index.tolist())
+        self.assertDictEqual(
+            {'FAKEID9': 'ID was not found in the EFetch response.'},
+            obs_missing
+        )
+
     def test_efetcher_inquire_single_multisample(self):
         with patch.object(Requester, 'request') as mock_request:
             mock_request.return_value = self.xml_to_response(
@@ -182,7 +204,7 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
     @patch.object(efetcher, 'Efetcher')
     @patch('q2_fondue.metadata._efetcher_inquire')
     def test_execute_efetcher(self, patch_efetch_iq, patch_ef):
-        patch_efetch_iq.return_value = None, None
+        patch_efetch_iq.return_value = pd.DataFrame(), {}
         _, _ = _execute_efetcher('someone@somewhere.com', 1,
                                  ['Valid1', 'Valid2', 'Valid3'],
                                  'INFO')
@@ -190,6 +212,67 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             ANY, ['Valid1', 'Valid2', 'Valid3'], 'INFO'
         )
 
+    @patch('q2_fondue.metadata.BATCH_SIZE', 2)
+    @patch.object(efetcher, 'Efetcher')
+    @patch('q2_fondue.metadata._efetcher_inquire')
+    def test_execute_efetcher_multiple_batches(
+            self, patch_efetch_iq, patch_ef):
+        patch_efetch_iq.side_effect = lambda _, ids, __: (
+            (pd.DataFrame({'meta1': [1, 2]}, index=ids), {})
+            if len(ids) == 2 else (pd.DataFrame(), {ids[0]: 'Fake error'})
+        )
+        obs_dfs, obs_missing = _execute_efetcher(
+            'someone@somewhere.com', 2,
+            ['Valid1', 'Valid2', 'Valid3'], 'INFO'
+        )
+
+        exp_df = pd.DataFrame({'meta1': [1, 2]}, index=['Valid1', 'Valid2'])
+        self.assertEqual(len(obs_dfs), 1)
+        assert_frame_equal(exp_df, obs_dfs[0])
+        self.assertDictEqual({'Valid3': 'Fake error'}, obs_missing)
+        patch_efetch_iq.assert_has_calls([
+            call(ANY, ['Valid1', 'Valid2'], 'INFO'),
+            call(ANY, ['Valid3'], 'INFO')
+        ], any_order=True)
+        # one Efetcher per batch
+        self.assertEqual(patch_ef.call_count, 2)
+
+    @patch('q2_fondue.metadata.BATCH_SIZE', 1)
+    def test_execute_efetcher_more_batches_than_jobs(self):
+        # real Efetchers can only run a single query each and need to be
+        # created in the main thread
+        with patch.object(Requester, 'request') as mock_request:
+            mock_request.side_effect = \
+                lambda *_: self.xml_to_response('single')
+            obs_dfs, obs_missing = _execute_efetcher(
+                'someone@somewhere.com', 1, ['FAKEID1', 'FAKEID2'], 'INFO'
+            )
+
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertListEqual(
+            [df.index.tolist() for df in obs_dfs], [['FAKEID1']]
+        )
+        self.assertDictEqual(
+            {'FAKEID2': 'ID was not found in the EFetch response.'},
+            obs_missing
+        )
+
+    @patch('q2_fondue.metadata.BATCH_SIZE', 1)
+    def test_execute_efetcher_more_batches_than_threads(self):
+        with patch.object(Requester, 'request') as mock_request:
+            mock_request.side_effect = \
+                lambda *_: self.xml_to_response('single')
+            obs_dfs, obs_missing = _execute_efetcher(
+                'someone@somewhere.com', 2,
+                ['FAKEID1', 'FAKEID2', 'FAKEID3'], 'INFO'
+            )
+
+        self.assertEqual(mock_request.call_count, 3)
+        self.assertListEqual(
+            [df.index.tolist() for df in obs_dfs], [['FAKEID1']]
+        )
+        self.assertListEqual(list(obs_missing.keys()), ['FAKEID2', 'FAKEID3'])
+
     def test_efetcher_inquire_error(self):
         with patch.object(Requester, 'request') as mock_response:
             mock_response.return_value = self.xml_to_response('error')
@@ -281,6 +364,48 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             second_analyzer.result.validate_result.call_count, 1)
         self.assertDictEqual(obs_invalid, {})
 
+    @patch('q2_fondue.utils.ESEARCH_BATCH_SIZE', 2)
+    @patch('entrezpy.esearch.esearcher.Esearcher')
+    def test_validate_run_ids_parallel_batches(self, mock_search):
+        ids = ['SRR000001', 'SRR000013', 'ERR3978173']
+        responses = {
+            'SRR000001 OR SRR000013': FakeAnalyzerValidation(
+                ['SRR000001', 'SRR000013'], [1, 1]),
+            'ERR3978173': FakeAnalyzerValidation(['ERR3978173'], [0])
+        }
+        responses['SRR000001 OR SRR000013'].result.validate_result\
+            .return_value = {}
+        responses['ERR3978173'].result.validate_result.return_value = {
+            'ERR3978173': 'ID is invalid.'}
+        mock_search.return_value.inquire.side_effect = \
+            lambda params, analyzer: responses[params['term']]
+
+        obs_invalid = _validate_run_ids(
+            'someone@somewhere.com', 2, ids, 'INFO')
+
+        self.assertEqual(mock_search.return_value.inquire.call_count, 2)
+        self.assertDictEqual(obs_invalid, {'ERR3978173': 'ID is invalid.'})
+
+    @patch('q2_fondue.utils.ESEARCH_BATCH_SIZE', 1)
+    def test_validate_run_ids_more_batches_than_jobs(self):
+        # real Esearchers can only run a single query each and need to be
+        # created in the main thread
+        with patch.object(Requester, 'request') as mock_request:
+            mock_request.side_effect = \
+                lambda *_: self.json_to_response('single', '_correct', True)
+            obs_invalid = _validate_run_ids(
+                'someone@somewhere.com', 1, ['SRR000001', 'SRR000013'],
+                'INFO'
+            )
+
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertListEqual(
+            [c.args[0].term for c in mock_request.call_args_list],
+            ['SRR000001', 'SRR000013']
+        )
+        # the response only contains the first ID
+        self.assertListEqual(list(obs_invalid.keys()), ['SRR000013'])
+
     def test_find_all_run_ids(self):
         fake_results = [
             {'RUN_SET': {'RUN': {'@accession': 'abc123', '@alias': 'run123'}}},
@@ -325,7 +450,7 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             {'meta1': [1, 2, 3], 'meta2': ['a', 'b', 'c']},
             index=['AB', 'cd', 'Ef']
         )
-        patch_ef.return_value = (exp_df, [])
+        patch_ef.return_value = ([exp_df], {})
         obs_df, obs_dict = _get_run_meta(
             'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'],
             False, 'INFO', self.fake_logger
@@ -335,7 +460,7 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
         patch_val.assert_called_once_with(
             'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'], 'INFO')
         patch_ef.assert_called_once_with(
-            'someone@somewhere.com', 1, ['AB', 'Ef', 'cd'], 'INFO'
+            'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'], 'INFO'
         )
 
     @patch('q2_fondue.metadata._validate_run_ids', return_value={})
@@ -346,7 +471,10 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             index=['AB', 'cd']
         )
         exp_missing = {'Ef': 'Fake error'}
-        patch_ef.return_value = (exp_meta.iloc[:2, :], exp_missing)
+        patch_ef.side_effect = [
+            ([exp_meta.iloc[:2, :]], exp_missing),
+            ([], exp_missing)
+        ]
 
         with self.assertLogs('test_log', level='WARNING') as cm:
             obs_df, missing_dict = _get_run_meta(
@@ -365,10 +493,84 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
 
             patch_val.assert_called_once_with(
                 'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'], 'INFO')
-            patch_ef.assert_called_once_with(
-                'someone@somewhere.com', 1, ['AB', 'Ef', 'cd'], 'INFO'
+            # the retry made no progress so it was not repeated
+            patch_ef.assert_has_calls([
+                call('someone@somewhere.com', 1, ['AB', 'cd', 'Ef'], 'INFO'),
+                call('someone@somewhere.com', 1, ['Ef'], 'INFO')
+            ])
+            self.assertEqual(patch_ef.call_count, 2)
+
+    @patch('q2_fondue.utils.random.uniform', side_effect=lambda _, x: x)
+    @patch('q2_fondue.metadata.time.sleep')
+    @patch('q2_fondue.metadata._validate_run_ids', return_value={})
+    @patch('q2_fondue.metadata._execute_efetcher')
+    def test_get_run_meta_missing_ids_retries_with_progress(
+            self, patch_ef, patch_val, patch_sleep, patch_rand):
+        exp_meta = pd.DataFrame(
+            {'meta1': [1, 2], 'meta2': ['a', 'b']},
+            index=['AB', 'cd']
+        )
+        patch_ef.side_effect = [
+            ([exp_meta.iloc[:1, :]], {'cd': 'Fake error', 'Ef': 'Error'}),
+            ([exp_meta.iloc[1:, :]], {'Ef': 'Fake error'}),
+            ([], {'Ef': 'Fake error'})
+        ]
+
+        obs_df, missing_dict = _get_run_meta(
+            'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'],
+            False, 'INFO', self.fake_logger
+        )
+
+        assert_frame_equal(exp_meta, obs_df)
+        self.assertDictEqual(missing_dict, {'Ef': 'Fake error'})
+        patch_ef.assert_has_calls([
+            call('someone@somewhere.com', 1, ['AB', 'cd', 'Ef'], 'INFO'),
+            call('someone@somewhere.com', 1, ['cd', 'Ef'], 'INFO'),
+            call('someone@somewhere.com', 1, ['Ef'], 'INFO')
+        ])
+        patch_sleep.assert_has_calls([call(0.4), call(0.8)])
+
+    @patch('q2_fondue.metadata._validate_run_ids', return_value={})
+    @patch('q2_fondue.metadata._execute_efetcher')
+    def test_get_run_meta_missing_ids_retried(self, patch_ef, patch_val):
+        exp_meta = pd.DataFrame(
+            {'meta1': [1, 2, 3], 'meta2': ['a', 'b', 'c']},
+            index=['AB', 'cd', 'Ef']
+        )
+        patch_ef.side_effect = [
+            ([exp_meta.iloc[:1, :], exp_meta.iloc[1:2, :]],
+             {'Ef': 'Fake error'}),
+            ([exp_meta.iloc[2:, :]], {})
+        ]
+
+        obs_df, missing_dict = _get_run_meta(
+            'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'],
+            False, 'INFO', self.fake_logger
+        )
+
+        assert_frame_equal(exp_meta, obs_df)
+        self.assertDictEqual(missing_dict, {})
+        self.assertEqual(patch_ef.call_count, 2)
+        patch_ef.assert_called_with(
+            'someone@somewhere.com', 1, ['Ef'], 'INFO')
+
+    @patch('q2_fondue.metadata._validate_run_ids', return_value={})
+    @patch('q2_fondue.metadata._execute_efetcher')
+    def test_get_run_meta_validation_not_cached(self, patch_ef, patch_val):
+        # validity of IDs can change over time, so results of previous
+        # validations are not re-used
+        patch_ef.return_value = ([], {})
+        for _ in range(2):
+            _get_run_meta(
+                'someone@somewhere.com', 1, ['AB', 'cd', 'Ef'],
+                False, 'INFO', self.fake_logger
             )
 
+        patch_val.assert_has_calls([
+            call('someone@somewhere.com', 1, ['AB', 'cd', 'Ef'], 'INFO')
+        ] * 2)
+        self.assertEqual(patch_ef.call_count, 2)
+
     @patch.object(esearcher, 'Esearcher')
     @patch('q2_fondue.metadata._validate_run_ids')
     @patch('q2_fondue.metadata._execute_efetcher')
@@ -396,7 +598,7 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             {'meta1': [1], 'meta2': ['a']},
             index=['AA']
         )
-        patch_ef.return_value = (exp_df, [])
+        patch_ef.return_value = ([exp_df], {})
 
         with self.assertLogs('test_log', level='WARNING') as cm:
             _ = _get_run_meta(
@@ -483,6 +685,40 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             )
             self.assertListEqual(sorted(exp_ids), obs_ids)
 
+    @patch('q2_fondue.metadata._get_run_meta')
+    @patch('entrezpy.esearch.esearcher.Esearcher')
+    @patch.object(_esearch, 'ESearchAnalyzer')
+    @patch('q2_fondue.entrezpy_clients._pipelines.BATCH_SIZE', 6)
+    def test_get_other_meta_overlapping_runs(
+            self, mock_analyzer, mock_search, mock_get
+    ):
+        exp_ids = ['SRR000007', 'SRR000018', 'SRR000020', 'SRR000038']
+        mock_search.return_value = self.fake_esearcher
+        mock_analyzer.return_value = MagicMock(
+            result=MagicMock(uids=['1', '2'])
+        )
+        mock_search.return_value.inquire = mock_analyzer
+        with patch.object(conduit, 'Conduit') as mock_conduit:
+            fake_analyzer1 = EFetchAnalyzer('INFO')
+            fake_analyzer1.result = MagicMock(metadata=exp_ids[:3])
+            fake_analyzer2 = EFetchAnalyzer('INFO')
+            fake_analyzer2.result = MagicMock(metadata=exp_ids[1:])
+            self.fake_econduit.analyzers = {
+                '1': ElinkAnalyzer,
+                '2': fake_analyzer1,
+                '3': fake_analyzer2
+            }
+            mock_conduit.return_value = self.fake_econduit
+
+            _get_other_meta(
+                'someone@somewhere.com', 1, ['AB', 'cd'], 'study',
+                'INFO', MagicMock()
+            )
+
+            mock_get.assert_called_once_with(
+                'someone@somewhere.com', 1, exp_ids, True, 'INFO', ANY
+            )
+
     @patch('q2_fondue.metadata._get_run_meta')
     @patch('q2_fondue.metadata._get_other_meta')
     def test_get_metadata_run(
@@ -497,6 +733,20 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
         )
         patched_get_other.assert_not_called()
 
+    @patch('q2_fondue.metadata._get_run_meta')
+    @patch('q2_fondue.metadata._get_other_meta')
+    def test_get_metadata_run_no_validation(
+            self, patched_get_other, patched_get_run):
+        patched_get_run.return_value = (pd.DataFrame(), {})
+        ids_meta = Metadata.load(self.get_data_path('run_ids.tsv'))
+        _ = get_metadata(ids_meta, 'abc@def.com', 2, validate_ids=False)
+
+        patched_get_run.assert_called_once_with(
+            'abc@def.com', 2, ['SRR123', 'SRR234', 'SRR345'],
+            True, 'INFO', ANY
+        )
+        patched_get_other.assert_not_called()
+
     @parameterized.expand([
         ("study", ['ERP12345', 'SRP23456']),
         ("bioproject", ['PRJNA123', 'PRJNA234']),
@@ -654,6 +904,19 @@ class TestMetadataFetching(_TestPluginWithEntrezFakeComponents):
             )
             assert_frame_equal(obs_df, exp_df)
 
+    def test_merge_metadata_same_values_diff_ids(self):
+        # Test merging metadata where records with different run IDs
+        # have identical values - none of them should be dropped
+        meta = [
+            pd.DataFrame({'A': ['a'], 'B': [1]}, index=['ID1']),
+            pd.DataFrame({'A': ['a'], 'B': [1]}, index=['ID2'])
+        ]
+        obs_df = merge_metadata(meta)
+        exp_df = pd.DataFrame(
+            {'A': ['a', 'a'], 'B': [1, 1]}, index=['ID1', 'ID2']
+        )
+        assert_frame_equal(obs_df, exp_df)
+
 
 if __name__ == "__main__":
     unittest.main()
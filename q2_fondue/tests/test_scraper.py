@@ -9,18 +9,19 @@ import os
 import json
 import pandas as pd
 import logging
+import threading
 from parameterized import parameterized
 from qiime2.plugin.testing import TestPluginBase
 from pandas._testing import assert_frame_equal
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 from pyzotero import zotero, zotero_errors
 from q2_fondue.scraper import (
-    _find_special_id,
+    _find_listed_ids, _compile_pattern, _find_all_accession_ids,
     _get_collection_id, _find_accession_ids,
     _find_doi_in_extra, _find_doi_in_arxiv_url,
     _get_parent_and_doi, _expand_dict,
     _link_attach_and_doi,
-    _get_attachment_keys, scrape_collection,
+    _get_attachment_keys, _scrape_attachment, scrape_collection,
     NoAccessionIDs
 )
 
@@ -38,10 +39,11 @@ class TestUtils4CollectionScraping(TestPluginBase):
         return json.load(file)
 
     def _create_doi_id_dataframe(self, doi_dict):
-        df = pd.DataFrame.from_dict([doi_dict]).transpose()
-        df.columns = ['DOI']
-        df.index.name = 'ID'
-        return df
+        return pd.DataFrame(
+            {'DOI': list(doi_dict.values())},
+            index=pd.Index(list(doi_dict.keys()), name='ID', dtype=object),
+            dtype=object
+        )
 
     @patch.object(zotero.Zotero, 'everything')
     @patch.object(zotero.Zotero, 'collections')
@@ -117,6 +119,19 @@ class TestUtils4CollectionScraping(TestPluginBase):
         obs_out = _get_parent_and_doi(items)
         self.assertDictEqual(exp_out, obs_out)
 
+    def test_get_parent_and_doi_precedence(self):
+        items = [
+            {'key': 'A', 'data': {'DOI': '10.1000/field'}},
+            {'key': 'B', 'data': {'DOI': '10.1000/field',
+                                  'extra': 'DOI: 10.1000/extra'}},
+            {'key': 'C', 'data': {'extra': 'DOI: 10.1000/extra',
+                                  'url': 'https://arxiv.org/abs/2106.11234'}}
+        ]
+        exp_out = {'A': '10.1000/field', 'B': '10.1000/extra',
+                   'C': '10.48550/arXiv.2106.11234'}
+        obs_out = _get_parent_and_doi(items)
+        self.assertDictEqual(exp_out, obs_out)
+
     def test_get_parent_and_doi_no_doi_error(self):
         items = self._open_json_file('scraper_items_no_doi.json')
         with self.assertRaisesRegex(KeyError, 'no items with associated DOI'):
@@ -140,49 +155,104 @@ class TestUtils4CollectionScraping(TestPluginBase):
 
     def test_link_attach_and_doi(self):
         items = self._open_json_file('scraper_items_journalarticle.json')
+        items_by_key = {item['key']: item for item in items}
         parent_doi = {'CP4ED2CY': '10.1038/s41467-021-26215-w'}
         exp_doi = '10.1038/s41467-021-26215-w'
-        obs_doi = _link_attach_and_doi(items, 'DMJ4AQ48', parent_doi)
+        obs_doi = _link_attach_and_doi(items_by_key, 'DMJ4AQ48', parent_doi)
         self.assertEqual(obs_doi, exp_doi)
 
     def test_link_attach_and_doi_no_parent_error(self):
         items = self._open_json_file('scraper_items_journalarticle.json')
+        items_by_key = {item['key']: item for item in items}
         parent_doi = {'other_parentID': '10.1038/s41467-021-26215-w'}
         with self.assertRaisesRegex(KeyError, 'DMJ4AQ48 does not contain'):
-            _link_attach_and_doi(items, 'DMJ4AQ48', parent_doi, 'error')
+            _link_attach_and_doi(items_by_key, 'DMJ4AQ48', parent_doi, 'error')
 
     def test_link_attach_and_doi_no_parent_ignore(self):
         items = self._open_json_file('scraper_items_journalarticle.json')
+        items_by_key = {item['key']: item for item in items}
         parent_doi = {'other_parentID': '10.1038/s41467-021-26215-w'}
         exp_out = ''
-        obs_out = _link_attach_and_doi(items, 'DMJ4AQ48', parent_doi, 'ignore')
+        obs_out = _link_attach_and_doi(
+            items_by_key, 'DMJ4AQ48', parent_doi, 'ignore')
         self.assertEqual(exp_out, obs_out)
 
-    def test_find_special_id_one_match(self):
-        txt = 'PRJDB1234: 2345 and 4567. How about another study?'
-        pattern = r'PRJ[EDN][A-Z]\s?\d+:\s\d+'
+    def test_find_listed_ids_one_match(self):
+        txt = 'PRJDB1234, 2345 and 4567. How about another study?'
 
-        exp_ids = ['PRJDB2345']
-        obs_ids = _find_special_id(txt, pattern, ':')
+        exp_ids = ['PRJDB2345', 'PRJDB4567']
+        obs_ids = _find_listed_ids(txt, 'bioproject')
         self.assertListEqual(sorted(obs_ids), sorted(exp_ids))
 
-    def test_find_special_id_two_matches(self):
-        txt = 'PRJDB1234: 2345 and 4567. How about another study? ' \
-              'PRJEA9876: 8765.'
-        pattern = r'PRJ[EDN][A-Z]\s?\d+:\s\d+'
+    def test_find_listed_ids_two_matches(self):
+        txt = 'PRJDB1234, 2345, 3456 and 4567. How about another study? ' \
+              'PRJEA9876 and 8765.'
 
-        exp_ids = ['PRJDB2345', 'PRJEA8765']
-        obs_ids = _find_special_id(txt, pattern, ':')
+        exp_ids = ['PRJDB2345', 'PRJDB3456', 'PRJDB4567', 'PRJEA8765']
+        obs_ids = _find_listed_ids(txt, 'bioproject')
         self.assertListEqual(sorted(obs_ids), sorted(exp_ids))
 
-    def test_find_special_id_no_match(self):
-        txt = 'How about another study?'
-        pattern = r'PRJ[EDN][A-Z]\s?\d+:\s\d+'
+    def test_find_listed_ids_no_match(self):
+        txt = 'PRJDB1234 is the only study.'
 
         exp_ids = []
-        obs_ids = _find_special_id(txt, pattern, ':')
+        obs_ids = _find_listed_ids(txt, 'bioproject')
         self.assertListEqual(sorted(obs_ids), sorted(exp_ids))
 
+    def test_find_all_accession_ids(self):
+        txt = 'Runs ERR2765209, 2765210 of ERP123456 and PRJEB4519-20 ' \
+              'but no experiments.'
+
+        exp_out = {
+            'run': ['ERR2765209', 'ERR2765210'], 'study': ['ERP123456'],
+            'bioproject': ['PRJEB4519', 'PRJEB4520'], 'experiment': []
+        }
+        obs_out = _find_all_accession_ids(txt, list(exp_out.keys()))
+        self.assertDictEqual(
+            exp_out, {k: sorted(v) for k, v in obs_out.items()})
+
+    @patch('q2_fondue.scraper._find_accession_ids', return_value=['ID'])
+    def test_scrape_attachment_shared_text(self, patch_find):
+        zot = MagicMock()
+        zot.fulltext_item.return_value = {'content': 'Shared text.'}
+        found_ids = {}
+
+        obs_1 = _scrape_attachment(zot, 'KEY1', ['run', 'study'], found_ids)
+        obs_1['run'].append('Other ID')
+        obs_2 = _scrape_attachment(zot, 'KEY2', ['run', 'study'], found_ids)
+
+        # the text is only searched once and the results are not affected
+        # by modifications of the ones returned before
+        self.assertDictEqual(obs_2, {'run': ['ID'], 'study': ['ID']})
+        self.assertEqual(patch_find.call_count, 2)
+        self.assertEqual(len(found_ids), 1)
+
+    @patch('q2_fondue.scraper._find_accession_ids', return_value=['ID'])
+    def test_scrape_attachment_not_memoized(self, patch_find):
+        zot = MagicMock()
+        zot.fulltext_item.return_value = {'content': 'Shared text.'}
+
+        _scrape_attachment(zot, 'KEY1', ['run', 'study'])
+        _scrape_attachment(zot, 'KEY2', ['run', 'study'])
+
+        self.assertEqual(patch_find.call_count, 4)
+
+    @patch('q2_fondue.scraper._find_accession_ids', return_value=[])
+    def test_scrape_attachment_surrogates(self, patch_find):
+        zot = MagicMock()
+        zot.fulltext_item.return_value = {'content': 'Text with \ud800.'}
+
+        obs = _scrape_attachment(zot, 'KEY1', ['run'], {})
+
+        self.assertDictEqual(obs, {'run': []})
+
+    def test_compile_pattern_cached(self):
+        pattern = r'PRJ[EDN][A-Z]\s?\d+:\s\d+'
+
+        obs_regex = _compile_pattern(pattern)
+        self.assertIs(obs_regex, _compile_pattern(pattern))
+        self.assertEqual(obs_regex.pattern, pattern)
+
     @parameterized.expand([
         ("run", "ERR2765209"),
         ("study", "ERP123456"),
@@ -241,6 +311,14 @@ class TestUtils4CollectionScraping(TestPluginBase):
         obs_proj = _find_accession_ids(txt_diff, 'bioproject')
         self.assertListEqual(sorted(exp_proj), sorted(obs_proj))
 
+    def test_find_accession_ids_special_cases_different_commas(self):
+        txt_diff = 'under accession numbers PRJEB11895 and 12577 as well '\
+                   'as PRJEB34555, 89765, 41427'
+        exp_proj = ['PRJEB11895', 'PRJEB12577', 'PRJEB34555',
+                    'PRJEB89765', 'PRJEB41427']
+        obs_proj = _find_accession_ids(txt_diff, 'bioproject')
+        self.assertListEqual(sorted(exp_proj), sorted(obs_proj))
+
     def test_find_accession_ids_special_cases_hyphen_one_digit(self):
         # example inspired by 10.1038/s41467-019-13036-1
         txt_diff = 'Breezer mWGS: PRJEB1479791–5'
@@ -249,6 +327,13 @@ class TestUtils4CollectionScraping(TestPluginBase):
         obs_proj = _find_accession_ids(txt_diff, 'bioproject')
         self.assertListEqual(sorted(exp_proj), sorted(obs_proj))
 
+    def test_find_accession_ids_special_cases_hyphen_one_digit_space(self):
+        txt_diff = 'Breezer mWGS: PRJEB1479791 – 5'
+        exp_proj = ['PRJEB1479791', 'PRJEB1479792', 'PRJEB1479793',
+                    'PRJEB1479794', 'PRJEB1479795']
+        obs_proj = _find_accession_ids(txt_diff, 'bioproject')
+        self.assertListEqual(sorted(exp_proj), sorted(obs_proj))
+
     def test_find_accession_ids_special_cases_hyphen_two_digits(self):
         # example inspired by 10.1038/s41467-019-13036-1
         txt_diff = 'Scott mWGS: PRJEB1479846–50'
@@ -321,6 +406,16 @@ class TestUtils4CollectionScraping(TestPluginBase):
         self.assertListEqual(exp_ls, obs_run)
         self.assertListEqual(exp_ls, obs_proj)
 
+    @patch('q2_fondue.scraper._find_hyphen_sequence')
+    @patch('q2_fondue.scraper._find_listed_ids')
+    def test_find_accession_ids_no_ids_special_cases_skipped(
+            self, patch_listed, patch_hyphen):
+        txt = 'this text has no run ids, 1234 and 5678 - 9.'
+        obs_run = _find_accession_ids(txt, 'run')
+        self.assertListEqual([], obs_run)
+        patch_listed.assert_not_called()
+        patch_hyphen.assert_not_called()
+
     def test_expand_dict_new_items(self):
         ext_dict = {'accID1': ['doi1']}
 
@@ -560,3 +655,92 @@ class TestCollectionScraping(TestUtils4CollectionScraping):
             exp_out[i].sort_index(inplace=True)
             obs_out[i].sort_index(inplace=True)
             assert_frame_equal(exp_out[i], obs_out[i])
+
+    @patch('q2_fondue.scraper._get_collection_id')
+    @patch.object(zotero.Zotero, 'everything')
+    @patch.object(zotero.Zotero, 'collection_items')
+    @patch.object(zotero.Zotero, 'fulltext_item')
+    def test_collection_scraper_multiple_jobs(
+            self, patch_zot_txt,
+            patch_col, patch_items, patch_get_col_id):
+        # define patched outputs
+        patch_items.return_value = self._open_json_file(
+            'scraper_item_multiple_dois.json')
+        contents = {
+            '64QNRRW6': "IDs are in PRJEB4519 and PRJEB7777.",
+            '8ISF4TZ4': "IDs are in PRJEB4519."
+        }
+        patch_zot_txt.side_effect = lambda key: {
+            "content": contents[key], "indexedPages": 50, "totalPages": 50
+        }
+
+        # check
+        exp_out = self._create_exp_out({
+            'bioproject': {'PRJEB7777': ['10.1038/s41586-021-04177-9'],
+                           'PRJEB4519': ['10.1038/s41586-021-04177-9',
+                                         '10.1038/s41564-022-01070-7']}})
+        obs_out = scrape_collection("test_collection", n_jobs=2)
+        for i in range(0, 4):
+            exp_out[i].sort_index(inplace=True)
+            obs_out[i].sort_index(inplace=True)
+            assert_frame_equal(exp_out[i], obs_out[i])
+
+    @parameterized.expand([(1, ), (2, )])
+    @patch('q2_fondue.scraper._find_all_accession_ids',
+           wraps=_find_all_accession_ids)
+    @patch('q2_fondue.scraper._get_collection_id')
+    @patch.object(zotero.Zotero, 'everything')
+    @patch.object(zotero.Zotero, 'collection_items')
+    @patch.object(zotero.Zotero, 'fulltext_item')
+    def test_collection_scraper_shared_text(
+            self, n_jobs, patch_zot_txt, patch_col, patch_items,
+            patch_get_col_id, patch_find):
+        items = self._open_json_file('scraper_item_multiple_dois.json')
+        # add another attachment to the first article
+        extra_attachment = dict(items[2], key='9XYZ1234')
+        patch_items.return_value = items + [extra_attachment]
+        patch_zot_txt.side_effect = lambda key: {
+            "content": "IDs are in PRJEB4519 and PRJEB7777.",
+            "indexedPages": 50, "totalPages": 50
+        }
+
+        obs_out = scrape_collection("test_collection", n_jobs=n_jobs)
+
+        # all three attachments share their text, which is searched once
+        self.assertEqual(patch_zot_txt.call_count, 3)
+        patch_find.assert_called_once()
+        dois = ['10.1038/s41586-021-04177-9', '10.1038/s41564-022-01070-7']
+        exp_out = self._create_exp_out({
+            'bioproject': {'PRJEB4519': dois, 'PRJEB7777': dois}})
+        for i in range(0, 5):
+            exp_out[i].sort_index(inplace=True)
+            obs_out[i].sort_index(inplace=True)
+            assert_frame_equal(exp_out[i], obs_out[i])
+
+    @patch('q2_fondue.scraper._get_collection_id')
+    @patch.object(zotero.Zotero, 'everything')
+    @patch.object(zotero.Zotero, 'collection_items')
+    @patch.object(zotero.Zotero, 'fulltext_item', autospec=True)
+    def test_collection_scraper_client_per_thread(
+            self, patch_zot_txt,
+            patch_col, patch_items, patch_get_col_id):
+        patch_items.return_value = self._open_json_file(
+            'scraper_item_multiple_dois.json')
+        clients = {}
+        # make sure both the attachments are fetched concurrently
+        both_fetching = threading.Barrier(2, timeout=5)
+
+        def _fulltext(zot, key):
+            clients.setdefault(threading.get_ident(), set()).add(id(zot))
+            both_fetching.wait()
+            return {"content": "IDs are in PRJEB4519.",
+                    "indexedPages": 50, "totalPages": 50}
+        patch_zot_txt.side_effect = _fulltext
+
+        scrape_collection("test_collection", n_jobs=2)
+
+        # every thread uses a client of its own
+        used = list(clients.values())
+        self.assertEqual(len(used), 2)
+        self.assertTrue(all(len(zots) == 1 for zots in used))
+        self.assertEqual(len(set.union(*used)), 2)
@@ -537,6 +537,8 @@ class TestUtils4SequenceFetching(SequenceTests):
         exp_casava_fpath = os.path.join(str(casava_out_single),
                                         ls_file_single[0] + '.gz')
         self.assertTrue(os.path.isfile(exp_casava_fpath))
+        self.assertFalse(os.path.isfile(
+            os.path.join(test_temp_dir.name, ls_file_single[0])))
         self.assertEqual(1, self.processed_q.qsize())
         self.assertTupleEqual(
             (1, [3]), self._validate_sequences_in_samples(casava_out_single)
@@ -6,19 +6,29 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import gzip
+import io
 import os
 import signal
 import tempfile
 import threading
 import unittest
+import urllib.request
+import urllib.response
+from email.message import Message
 from threading import Thread
 from unittest.mock import patch, MagicMock
 
+from entrezpy.requester import requester
 from qiime2.plugin.testing import TestPluginBase
 from tqdm import tqdm
 
+from q2_fondue.entrezpy_clients._utils import (set_up_logger,
+                                               set_log_level,
+                                               gzip_efetch_responses,
+                                               _GzipEFetchHandler)
 from q2_fondue.utils import (handle_threaded_exception, _has_enough_space,
-                             _find_next_id, _chunker, _rewrite_fastq)
+                             _find_next_id, _chunker, _rewrite_fastq,
+                             _RateLimiter, _backoff_delay, _load_dotenv)
 
 
 class TestExceptHooks(unittest.TestCase):
@@ -132,6 +142,44 @@ class TestSRAUtils(TestPluginBase):
         exp_out = ['A', 'B', 'C']
         self.assertEqual(next(obs_out), exp_out)
 
+    @patch.dict(os.environ, {}, clear=True)
+    def test_rate_limiter_no_api_key(self):
+        limiter = _RateLimiter()
+        self.assertAlmostEqual(limiter.interval, 1 / 3)
+
+    @patch.dict(os.environ, {'NCBI_API_KEY': 'abc123'})
+    def test_rate_limiter_api_key(self):
+        limiter = _RateLimiter()
+        self.assertAlmostEqual(limiter.interval, 1 / 10)
+
+    @patch('dotenv.load_dotenv')
+    def test_load_dotenv_once(self, patch_load):
+        _load_dotenv.cache_clear()
+
+        _load_dotenv()
+        _load_dotenv()
+
+        patch_load.assert_called_once_with()
+
+    @patch('q2_fondue.utils.random.uniform', side_effect=lambda _, x: x)
+    def test_backoff_delay(self, patch_rand):
+        obs = [_backoff_delay(attempt, 1, 5) for attempt in range(1, 6)]
+
+        self.assertListEqual(obs, [2, 4, 5, 5, 5])
+        patch_rand.assert_called_with(1, 5)
+
+    def test_backoff_delay_minimum(self):
+        obs = [_backoff_delay(attempt, 60, 300) for attempt in range(1, 50)]
+
+        self.assertTrue(all(60 <= delay <= 300 for delay in obs))
+
+    @patch('q2_fondue.utils.random.uniform', side_effect=lambda x, _: x)
+    def test_backoff_delay_cap_below_base(self, patch_rand):
+        obs = _backoff_delay(1, 10, 5)
+
+        self.assertEqual(obs, 10)
+        patch_rand.assert_called_once_with(10, 10)
+
     def test_rewrite_fastq(self):
         file_in = self.get_data_path('SRR123456.fastq')
         file_out = tempfile.NamedTemporaryFile()
@@ -146,6 +194,134 @@ class TestSRAUtils(TestPluginBase):
         # clean up
         file_out.close()
 
+    def test_set_up_logger_handler_added_once(self):
+        logger = set_up_logger('INFO', logger_name='test_handlers')
+        logger = set_up_logger('DEBUG', logger_name='test_handlers')
+
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertEqual(logger.level, 10)
+
+    def test_set_log_level_unchanged(self):
+        logger = set_up_logger('INFO', logger_name='test_levels')
+
+        with patch.object(logger, 'setLevel') as patch_set:
+            set_log_level(logger, 'INFO')
+            patch_set.assert_not_called()
+
+            set_log_level(logger, 'DEBUG')
+            patch_set.assert_called_once_with('DEBUG')
+
+    def test_gzip_efetch_handler_request(self):
+        handler = _GzipEFetchHandler()
+        base = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils'
+
+        efetch = handler.https_request(
+            urllib.request.Request(f'{base}/efetch.fcgi'))
+        esearch = handler.https_request(
+            urllib.request.Request(f'{base}/esearch.fcgi'))
+
+        self.assertEqual(efetch.get_header('Accept-encoding'), 'gzip')
+        self.assertIsNone(esearch.get_header('Accept-encoding'))
+
+    def test_gzip_efetch_handler_response(self):
+        handler = _GzipEFetchHandler()
+        headers = Message()
+        headers['Content-Encoding'] = 'gzip'
+        response = urllib.response.addinfourl(
+            io.BytesIO(gzip.compress(b'<xml/>')), headers,
+            'https://some.url/efetch.fcgi', 200
+        )
+
+        response.msg = 'OK'
+
+        obs = handler.https_response(None, response)
+
+        self.assertEqual(obs.read(), b'<xml/>')
+        self.assertEqual(obs.code, 200)
+        self.assertEqual(obs.msg, 'OK')
+        self.assertIsNone(obs.headers.get('Content-Encoding'))
+
+    def test_gzip_efetch_handler_error_response(self):
+        # error responses need to be decompressed before urllib turns
+        # them into an HTTPError
+        self.assertLess(
+            _GzipEFetchHandler.handler_order,
+            urllib.request.HTTPErrorProcessor.handler_order
+        )
+        handler = _GzipEFetchHandler()
+        headers = Message()
+        headers['Content-Encoding'] = 'gzip'
+        response = urllib.response.addinfourl(
+            io.BytesIO(gzip.compress(b'<ERROR/>')), headers,
+            'https://some.url/efetch.fcgi', 429
+        )
+        response.msg = 'Too Many Requests'
+        opener = MagicMock()
+        processor = urllib.request.HTTPErrorProcessor()
+        processor.add_parent(opener)
+
+        processor.https_response(
+            None, handler.https_response(None, response))
+
+        obs = opener.error.call_args.args[2]
+        self.assertEqual(obs.read(), b'<ERROR/>')
+        self.assertEqual(opener.error.call_args.args[3:5],
+                         (429, 'Too Many Requests'))
+
+    @patch('urllib.request.install_opener')
+    def test_gzip_efetch_responses(self, patch_install):
+        original = requester.urllib
+
+        with gzip_efetch_responses():
+            obs = requester.urllib.request.urlopen
+            self.assertTrue(any(
+                isinstance(h, _GzipEFetchHandler)
+                for h in obs.__self__.handlers
+            ))
+
+        # only Entrezpy's requester was affected and only temporarily
+        self.assertIs(requester.urllib, original)
+        patch_install.assert_not_called()
+
+    def test_gzip_efetch_responses_nested(self):
+        original = requester.urllib
+
+        with gzip_efetch_responses():
+            outer = requester.urllib
+            with gzip_efetch_responses():
+                self.assertIs(requester.urllib, outer)
+            # the outer context still needs the compressed responses
+            self.assertIs(requester.urllib, outer)
+            self.assertIsNot(outer, original)
+
+        self.assertIs(requester.urllib, original)
+
+    def test_gzip_efetch_responses_overlapping(self):
+        original = requester.urllib
+        first = gzip_efetch_responses()
+        second = gzip_efetch_responses()
+
+        first.__enter__()
+        patched = requester.urllib
+        second.__enter__()
+        # exiting in a different order than entered
+        first.__exit__(None, None, None)
+        self.assertIs(requester.urllib, patched)
+        second.__exit__(None, None, None)
+
+        self.assertIs(requester.urllib, original)
+
+    def test_gzip_efetch_handler_response_plain(self):
+        handler = _GzipEFetchHandler()
+        response = urllib.response.addinfourl(
+            io.BytesIO(b'<xml/>'), Message(),
+            'https://some.url/efetch.fcgi', 200
+        )
+
+        obs = handler.https_response(None, response)
+
+        self.assertIs(obs, response)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -7,11 +7,18 @@
 # ----------------------------------------------------------------------------
 import gzip
 import os
+import random
+import re
 import shutil
 import signal
 import subprocess
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Tuple
 
+import dotenv
 from entrezpy.esearch import esearcher as es
 from tqdm import tqdm
 
@@ -20,12 +27,86 @@ from q2_fondue.entrezpy_clients._utils import (
     PREFIX, InvalidIDs, set_up_logger, set_up_entrezpy_logging)
 
 LOGGER = set_up_logger('INFO', logger_name=__name__)
+ESEARCH_BATCH_SIZE = 500
+FASTQ_GZIP_LEVEL = 6
+# anchored patterns matching accession ID prefixes of every ID type
+ID_PATTERNS = {
+    kind: re.compile('|'.join(prefixes)) for kind, prefixes in PREFIX.items()
+}
 
 
 class DownloadError(Exception):
     pass
 
 
+def _ncbi_request_rate() -> int:
+    """Returns the number of requests per second allowed by NCBI.
+
+    Entrezpy picks up an API key stored in the NCBI_API_KEY environment
+    variable on its own - with the key NCBI allows 10 instead of 3 requests
+    per second.
+    """
+    return 10 if 'NCBI_API_KEY' in os.environ else 3
+
+
+class _RateLimiter:
+    """Spaces out calls made from multiple threads.
+
+    Since every Entrezpy query only throttles its own requests, a single
+    limiter needs to be shared by all the queries which are running
+    concurrently to stay within NCBI's request limit.
+
+    Args:
+        rate (float): Maximum number of calls per second. Defaults to
+            the rate allowed by NCBI (see `_ncbi_request_rate`).
+    """
+    def __init__(self, rate: float = None):
+        self.interval = 1 / (rate or _ncbi_request_rate())
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+
+    def wait(self):
+        """Blocks until the next call is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+@lru_cache(maxsize=None)
+def _load_dotenv():
+    """Loads environment variables from the .env file once per process.
+
+    Variables which are already set are never overridden by the file, so
+    loading it again could only pick up variables added in the meantime.
+    """
+    dotenv.load_dotenv()
+
+
+def _backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Returns a randomised delay before the given retry.
+
+    The delay is drawn uniformly between `base` and an upper bound which
+    grows exponentially with the attempt number and is capped. Waiting at
+    least `base` gives transient throttling by NCBI time to clear, while
+    the jitter keeps retries of concurrent requests from hitting NCBI all
+    at once.
+
+    Args:
+        attempt (int): Number of the retry (starting at 1).
+        base (float): Minimal delay (in seconds) - the upper bound of the
+            delay is twice that before the first retry and doubles with
+            every subsequent retry.
+        cap (float): Maximal delay (in seconds).
+
+    Returns:
+        float: Delay (in seconds).
+    """
+    return random.uniform(base, max(base, min(cap, base * 2 ** attempt)))
+
+
 def _chunker(seq, size):
     # source: https://stackoverflow.com/a/434328/579416
     return (seq[pos:pos + size] for pos in range(0, len(seq), size))
@@ -35,6 +116,13 @@ def _validate_run_ids(
         email: str, n_jobs: int, run_ids: List[str], log_level: str) -> dict:
     """Validates provided accession IDs using ESearch.
 
+    IDs are validated in batches of ESEARCH_BATCH_SIZE to keep the search
+    term within NCBI's URL length limits - the batches are processed by up
+    to `n_jobs` threads, sharing a single rate limiter so that no more
+    requests per second than allowed by NCBI are sent. Every batch is
+    searched with its own Esearcher, created up front in the main thread
+    (see `_execute_efetcher` in the metadata module).
+
     Args:
         email (str): A valid e-mail address.
         n_jobs (int): Number of threads to be used in parallel.
@@ -44,16 +132,16 @@ def _validate_run_ids(
     Returns:
         dict: Dictionary of invalid IDs (as keys) with a description.
     """
-    # must process in batches because esearch requests with
-    # runID count > 10'000 fail
-    invalid_ids = {}
-    for batch in _chunker(run_ids, 10000):
+    def _create_esearcher():
         esearcher = es.Esearcher(
             'esearcher', email, apikey=None,
             apikey_var=None, threads=0, qid=None
         )
         set_up_entrezpy_logging(esearcher, log_level)
+        return esearcher
 
+    def _validate_batch(esearcher, batch):
+        rate_limiter.wait()
         esearch_response = esearcher.inquire(
             {
                 'db': 'sra',
@@ -61,15 +149,26 @@ def _validate_run_ids(
                 'usehistory': False
             }, analyzer=ESearchAnalyzer(batch)
         )
-        invalid_ids.update(esearch_response.result.validate_result())
+        return esearch_response.result.validate_result()
+
+    batches = list(_chunker(run_ids, ESEARCH_BATCH_SIZE))
+    n_workers = max(min(n_jobs, len(batches)), 1)
+    rate_limiter = _RateLimiter()
+    esearchers = [_create_esearcher() for _ in batches]
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(_validate_batch, esearchers, batches))
+
+    invalid_ids = {}
+    for batch_invalid_ids in results:
+        invalid_ids.update(batch_invalid_ids)
 
     return invalid_ids
 
 
-def _determine_id_type(ids: list):
-    ids = [x[:3] for x in ids]
-    for kind in PREFIX.keys():
-        if all([x in PREFIX[kind] for x in ids]):
+@lru_cache(maxsize=128)
+def _determine_prefix_type(prefixes: Tuple[str]):
+    for kind, pattern in ID_PATTERNS.items():
+        if all(map(pattern.match, prefixes)):
             return kind
     raise InvalidIDs('The type of provided IDs is either not supported or '
                      'IDs of mixed types were provided. Please provide IDs '
@@ -77,6 +176,12 @@ def _determine_id_type(ids: list):
                      '(#S|E|DRP) or NCBI BioProject IDs (#PRJ).')
 
 
+def _determine_id_type(ids: list):
+    # all the known prefixes are three characters long, so only the set
+    # of unique prefixes needs to be checked (and can be cached)
+    return _determine_prefix_type(tuple(sorted({_id[:3] for _id in ids})))
+
+
 def handle_threaded_exception(args):
     logger = set_up_logger('DEBUG', logger_name='ThreadedErrorsManager')
     msg = 'Data fetching was interrupted by the following error: \n'
@@ -146,5 +251,8 @@ def _find_next_id(acc_id: str, progress_bar: tqdm):
 
 
 def _rewrite_fastq(file_in: str, file_out: str):
-    with open(file_in, 'rb') as f_in, gzip.open(file_out, 'wb') as f_out:
+    # level 6 (zlib's default) compresses several times faster than gzip's
+    # default level 9, at the cost of only slightly larger files
+    with open(file_in, 'rb') as f_in, \
+            gzip.open(file_out, 'wb', compresslevel=FASTQ_GZIP_LEVEL) as f_out:
         shutil.copyfileobj(f_in, f_out)